@@ -0,0 +1,436 @@
+#!/usr/bin/env python
+"""
+Micro benchmarks for cybach's hot paths.
+
+Usage: benchmarks.py {<benchmark_name>|all}
+"""
+
+from __future__ import division
+
+import copy
+import random
+import sys
+import timeit
+
+import chords
+import config
+import examples
+import fileloader
+import harmony
+import instruments
+import ks
+import note_picker
+import parts
+import pitches
+import progression
+import sequences
+import util
+import voicing_cache
+from pitches import Pitch
+from rhythm import time
+
+LOOKUPS = 10000
+
+
+def sequence_lookup():
+    """
+    Times Sequence.entity() and Entity.previous_entity() at random positions as the number of entities grows.
+    Cost per lookup should stay roughly flat from 100 to 100k entities.
+    """
+    print '%10s %16s %16s' % ('entities', 'entity() us', 'previous() us')
+
+    for entity_count in (100, 1000, 10000, 100000):
+        sequence = __build_sequence(entity_count)
+        positions = [random.randrange(config.song_length) for i in range(LOOKUPS)]
+        entities = [sequence.entity(position) for position in positions]
+
+        entity_time = timeit.timeit(lambda: [sequence.entity(position) for position in positions], number=1)
+        previous_time = timeit.timeit(lambda: [entity.previous_entity() for entity in entities], number=1)
+
+        print '%10d %16.3f %16.3f' % (entity_count, entity_time / LOOKUPS * 1e6, previous_time / LOOKUPS * 1e6)
+
+
+def sequence_memory():
+    """
+    Estimates bytes held per entity by the default EntityMap storage and by compact (array-backed) storage, along
+    with the time taken by a bulk scan (Sequence.note_duration_count) over each.
+    """
+    entity_count = 100000
+    print '%10s %16s %16s' % ('storage', 'bytes/entity', 'scan ms')
+
+    for compact in (False, True):
+        sequence = __build_sequence(entity_count, compact)
+        scan_time = timeit.timeit(sequence.note_duration_count, number=1)
+
+        print '%10s %16.1f %16.3f' % ('compact' if compact else 'entities',
+                                      __storage_size(sequence.entities()) / entity_count, scan_time * 1e3)
+
+
+def sequence_snapshots():
+    """
+    Times trying a single-note edit on a copy-on-write snapshot of a sequence versus on a deep copy of it, as the
+    number of entities grows. A snapshot trial should cost about the same regardless of sequence length.
+    """
+    trials = 100
+    print '%10s %16s %16s' % ('entities', 'snapshot us', 'deepcopy us')
+
+    for entity_count in (100, 1000, 10000):
+        sequence = __build_sequence(entity_count)
+        positions = [random.randrange(config.song_length - config.resolution) for i in range(trials)]
+
+        def trial(copy_function):
+            for position in positions:
+                candidate = copy_function(sequence)
+                candidate.add_entity(sequences.Note(candidate, position, position + config.resolution, Pitch(50)))
+
+        snapshot_time = timeit.timeit(lambda: trial(lambda s: s.snapshot()), number=1)
+        deepcopy_time = timeit.timeit(lambda: trial(copy.deepcopy), number=1)
+
+        print '%10d %16.3f %16.3f' % (entity_count, snapshot_time / trials * 1e6, deepcopy_time / trials * 1e6)
+
+
+def note_picking():
+    """
+    Times picking every strong beat of each example with NotePicker's scalar and batched scoring, in beats per second
+    """
+    print '%16s %16s %16s' % ('example', 'scalar beats/s', 'batched beats/s')
+
+    for name in sorted(examples.ALL.keys()):
+        rates = []
+
+        for batched in (False, True):
+            fileloader.load(name, False)
+            picker = note_picker.NotePicker(batched)
+            beat_count = [0]
+
+            def pick():
+                for beat, next_beat in util.with_next(time.iter_strong_beats()):
+                    picked = picker.compute(beat)
+                    end = config.song_length if next_beat is None else next_beat.start()
+
+                    for sequence, position in ((sequences.alto(), note_picker.ALTO_POSITION),
+                                               (sequences.tenor(), note_picker.TENOR_POSITION),
+                                               (sequences.bass(), note_picker.BASS_POSITION)):
+                        sequence.add_entities(sequences.Note(sequence, beat.start(), end, picked[position]))
+
+                    beat_count[0] += 1
+
+            elapsed = timeit.timeit(pick, number=1)
+            rates.append(beat_count[0] / elapsed)
+
+            chords.clear()
+            time.clear()
+            ks.clear()
+
+        print '%16s %16.1f %16.1f' % (name, rates[0], rates[1])
+
+
+def same_species():
+    """
+    Times pitches.same_species() on midi values, Pitch objects and note names against the scan over MIDI_VALUES it
+    used to perform for every species lookup.
+    """
+    calls = 10000
+    values = {
+        'int': [random.randrange(128) for i in range(calls + 1)],
+        'Pitch': [pitches.parse(random.randrange(128)) for i in range(calls + 1)],
+        'name': [random.choice(pitches.PITCH_COEFS.keys()) for i in range(calls + 1)]
+    }
+    print '%10s %16s %16s' % ('values', 'scan us', 'table us')
+
+    for kind in ('int', 'Pitch', 'name'):
+        pairs = zip(values[kind], values[kind][1:])
+        scan_time = timeit.timeit(lambda: [__scanned_species(a) == __scanned_species(b) for a, b in pairs], number=1)
+        table_time = timeit.timeit(lambda: [pitches.same_species(a, b) for a, b in pairs], number=1)
+
+        print '%10s %16.3f %16.3f' % (kind, scan_time / calls * 1e6, table_time / calls * 1e6)
+
+
+def sequence_build():
+    """
+    Times filling an empty accompaniment voice with one quarter note per beat through add_entities, one call per
+    note as cybach.py does, versus a single add_run.
+    """
+    print '%10s %16s %16s' % ('notes', 'add_entities ms', 'add_run ms')
+
+    for note_count in (100, 1000, 10000):
+        config.song_length = note_count * config.resolution
+
+        def build(bulk):
+            sequence = sequences.AccompanimentSequence(config.song_length, parts.BASS)
+            notes = [sequences.Note(sequence, i * config.resolution, (i + 1) * config.resolution, Pitch(48 + i % 12))
+                     for i in range(note_count)]
+
+            if bulk:
+                sequence.add_run(notes)
+            else:
+                for note in notes:
+                    sequence.add_entities(note)
+
+        print '%10d %16.3f %16.3f' % (note_count, timeit.timeit(lambda: build(False), number=1) * 1e3,
+                                      timeit.timeit(lambda: build(True), number=1) * 1e3)
+
+
+def signature_edits():
+    """
+    Times laying out a time grid with set_signatures(), materializing every Measure and Beat of it, and replacing
+    a single signature in the middle of it as the number of signature changes grows. Layout and edits only touch a
+    few integers per signature change, so both stay far below the cost of materializing the grid.
+    """
+    print '%12s %16s %16s %16s' % ('signatures', 'layout ms', 'materialize ms', 'one edit ms')
+
+    for signature_count in (10, 100, 1000):
+        signatures = {}
+        position = 0
+        for i in range(signature_count):
+            signature = time.TimeSignature(numerator=3 + i % 2, denominator=4)
+            signatures[position] = signature
+            position += 4 * signature.samples_per_measure()
+
+        config.song_length = position
+        layout_time = timeit.timeit(lambda: time.set_signatures(signatures), number=1)
+        materialize_time = timeit.timeit(lambda: [m.beats() for m in time.iter_measures()], number=1)
+
+        middle = sorted(signatures.keys())[signature_count // 2]
+        edit_time = timeit.timeit(lambda: time.add_signature(middle, time.TimeSignature(numerator=5, denominator=4)),
+                                  number=1)
+
+        print '%12d %16.3f %16.3f %16.3f' % (signature_count, layout_time * 1e3, materialize_time * 1e3,
+                                             edit_time * 1e3)
+
+    time.clear()
+
+
+def arrangement_search():
+    """
+    Times picking the initial accompaniment of each example beat by beat with NotePicker and all at once with
+    ProgressionPicker, along with the total NotePicker.score() each arrangement gets
+    """
+    print '%16s %12s %12s %12s %12s' % ('example', 'greedy ms', 'greedy score', 'viterbi ms', 'viterbi score')
+
+    for name in sorted(examples.ALL.keys()):
+        fileloader.load(name, False)
+        greedy_score = []
+        greedy_time = timeit.timeit(lambda: greedy_score.append(__greedy_arrangement()), number=1)
+        __clear()
+
+        fileloader.load(name, False)
+        picker = progression.ProgressionPicker()
+        viterbi_time = timeit.timeit(picker.compute, number=1)
+        __clear()
+
+        print '%16s %12.1f %12.3f %12.1f %12.3f' % (name, greedy_time * 1e3, greedy_score[0], viterbi_time * 1e3,
+                                                    picker.score)
+
+
+def beam_widths():
+    """
+    Times BeamPicker on each example for a range of beam widths, along with the total score of the arrangement it
+    picks, and ProgressionPicker for comparison. Neither score is an upper bound for the other: ProgressionPicker only
+    follows flicker history along each voicing's best predecessor, so wide beams can beat it.
+    """
+    widths = (1, 2, 4, 8, 16, 32, 64)
+    print '%16s %8s %12s %12s' % ('example', 'width', 'ms', 'score')
+
+    for name in sorted(examples.ALL.keys()):
+        fileloader.load(name, False)
+
+        for width in widths:
+            picker = progression.BeamPicker(width)
+            elapsed = timeit.timeit(picker.compute, number=1)
+
+            print '%16s %8d %12.1f %12.3f' % (name, width, elapsed * 1e3, picker.score)
+
+        viterbi = progression.ProgressionPicker()
+        elapsed = timeit.timeit(viterbi.compute, number=1)
+        print '%16s %8s %12.1f %12.3f' % (name, 'viterbi', elapsed * 1e3, viterbi.score)
+
+        __clear()
+
+
+def bounded_search():
+    """
+    Picks every strong beat of each example by scoring all candidates (batched) and by branch and bound, with the
+    default part ranges and with the wider ranges of violin, cello and tuba. Reports the candidates scored
+    exhaustively, the nodes the bounded search expanded and pruned, and the time taken by each.
+    """
+    print '%16s %8s %12s %12s %12s %14s %14s' % ('example', 'ranges', 'candidates', 'expanded', 'pruned',
+                                                 'exhaustive ms', 'bounded ms')
+
+    for name in sorted(examples.ALL.keys()):
+        for ranges in ('default', 'wide'):
+            fileloader.load(name, False)
+
+            if ranges == 'wide':
+                for sequence, instrument in ((sequences.alto(), instruments.VIOLIN),
+                                             (sequences.tenor(), instruments.CELLO),
+                                             (sequences.bass(), instruments.TUBA)):
+                    sequence._part = parts.Part(instrument.max_low_pitch, instrument.max_high_pitch,
+                                                sequence.part().title, avoids_low=sequence.part().avoids_low)
+
+            exhaustive = note_picker.NotePicker(batched=True)
+            bounded = note_picker.NotePicker(bounded=True)
+            candidate_count = 0
+            times = [0.0, 0.0]
+
+            for beat, next_beat in util.with_next(time.iter_strong_beats()):
+                candidate_count += len(note_picker.get_candidate_matrix(beat, progression.soprano_value(beat)))
+                picked = []
+                times[0] += timeit.timeit(lambda: picked.append(exhaustive.compute(beat)), number=1)
+                times[1] += timeit.timeit(lambda: picked.append(bounded.compute(beat)), number=1)
+                end = config.song_length if next_beat is None else next_beat.start()
+
+                for position, sequence in progression.VOICES:
+                    sequence().add_entities(sequences.Note(sequence(), beat.start(), end, picked[0][position]))
+
+            __clear()
+
+            print '%16s %8s %12d %12d %12d %14.1f %14.1f' % (name, ranges, candidate_count, bounded.expanded,
+                                                             bounded.pruned, times[0] * 1e3, times[1] * 1e3)
+
+
+def voicing_lookup():
+    """
+    Builds the voicings of every strong beat of each example by filtering the product of each part's available
+    notes, as note_picker.get_candidate_matrix() did before voicings were cached, then through an empty voicing cache
+    and through the same cache again once it is warm. Reports the distinct chords, the chord types stored by the cache
+    and the time taken by each.
+    """
+    print '%16s %8s %8s %12s %12s %12s' % ('example', 'chords', 'types', 'scanned ms', 'cold ms', 'warm ms')
+
+    for name in sorted(examples.ALL.keys()):
+        fileloader.load(name, False)
+        context = harmony.timeline()
+        beats = [(context.chord(time.beat_index(beat.start())), progression.soprano_value(beat))
+                 for beat in time.iter_strong_beats()]
+        parts_used = (sequences.alto().part(), sequences.tenor().part(), sequences.bass().part())
+        cache = voicing_cache.VoicingCache()
+
+        def scanned():
+            for chord, soprano in beats:
+                [group for group in note_picker.combine_pitch_candidates(*[part.available_notes(chord) + [-1]
+                                                                           for part in parts_used])
+                 if note_picker.parts_dont_cross(group, soprano)]
+
+        def cached():
+            for chord, soprano in beats:
+                cache.voicings(chord.mask(), *parts_used)
+
+        scanned_time = timeit.timeit(scanned, number=1)
+        cold_time = timeit.timeit(cached, number=1)
+        warm_time = timeit.timeit(cached, number=1)
+        chord_count = len(set(chord.string() for chord, soprano in beats))
+
+        print '%16s %8d %8d %12.1f %12.1f %12.1f' % (name, chord_count, len(cache), scanned_time * 1e3,
+                                                     cold_time * 1e3, warm_time * 1e3)
+
+        __clear()
+
+
+def __greedy_arrangement():
+    """
+    Picks and writes the initial accompaniment one strong beat at a time, as cybach.py does by default
+
+    :return: total score of the arrangement
+    """
+    picker = note_picker.NotePicker(batched=True)
+    score = 0.0
+
+    for beat, next_beat in util.with_next(time.iter_strong_beats()):
+        picked = list(picker.compute(beat))
+        score += picker.score(beat, picked)
+        end = config.song_length if next_beat is None else next_beat.start()
+
+        for position, sequence in progression.VOICES:
+            sequence().add_entities(sequences.Note(sequence(), beat.start(), end, picked[position]))
+
+    return score
+
+
+def __clear():
+    chords.clear()
+    time.clear()
+    ks.clear()
+
+
+def __scanned_species(value):
+    """
+    Species lookup by scanning MIDI_VALUES, as pitches.species() did before it was backed by a table
+    """
+    int_value = value
+    if isinstance(value, str):
+        int_value = pitches.midi_value(value)
+    elif isinstance(value, Pitch):
+        int_value = value.midi()
+
+    for key in pitches.MIDI_VALUES:
+        if pitches.MIDI_VALUES[key] % 12 == int_value % 12:
+            return key[0:len(key) - 2] if '10' in key else key[0:len(key) - 1]
+
+
+def __storage_size(entity_map):
+    """
+    Shallow sizes of the containers backing an entity map plus, for object storage, each entity and each distinct
+    pitch object
+
+    :param entity_map: sequences.EntityMap or sequences.CompactEntityMap
+    :return: approximate size in bytes
+    """
+    if isinstance(entity_map, sequences.CompactEntityMap):
+        return sum(sys.getsizeof(column) for column in entity_map.columns())
+
+    size = sys.getsizeof(entity_map.store) + sys.getsizeof(entity_map._positions)
+    for entity in entity_map.store.values():
+        size += sys.getsizeof(entity) + sys.getsizeof(entity.__dict__)
+
+    notes = [entity for entity in entity_map.store.values() if entity.is_note()]
+    for pitch in {id(note.pitch()): note.pitch() for note in notes}.values():
+        size += sys.getsizeof(pitch) + sys.getsizeof(pitch.__dict__)
+
+    return size
+
+
+def __build_sequence(entity_count, compact=False):
+    """
+    Builds an AccompanimentSequence holding entity_count alternating quarter notes and rests
+
+    :param entity_count: number of entities in the sequence
+    :param compact: whether the sequence uses array-backed storage
+    :return: sequences.AccompanimentSequence
+    """
+    config.song_length = entity_count * config.resolution
+    sequence = sequences.AccompanimentSequence(config.song_length, parts.BASS, compact=compact)
+    pitch = Pitch(48)
+
+    for i in range(0, entity_count, 2):
+        start = i * config.resolution
+        sequence.add_entity(sequences.Note(sequence, start, start + config.resolution, pitch))
+
+    return sequence
+
+
+ALL = {
+    'arrangement_search': arrangement_search,
+    'beam_widths': beam_widths,
+    'bounded_search': bounded_search,
+    'note_picking': note_picking,
+    'same_species': same_species,
+    'sequence_build': sequence_build,
+    'sequence_lookup': sequence_lookup,
+    'sequence_memory': sequence_memory,
+    'sequence_snapshots': sequence_snapshots,
+    'signature_edits': signature_edits,
+    'voicing_lookup': voicing_lookup
+}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or (sys.argv[1] != 'all' and sys.argv[1] not in ALL.keys()):
+        print 'Usage: benchmarks.py {<benchmark_name>|all}'
+        print 'Valid benchmark names: ' + ', '.join(sorted(ALL.keys()))
+        exit(2)
+
+    names = sorted(ALL.keys()) if sys.argv[1] == 'all' else [sys.argv[1]]
+    for name in names:
+        print '~~~~~~~~ ' + name + ' ~~~~~~~~'
+        ALL[name]()
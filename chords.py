@@ -1,3 +1,5 @@
+import array
+import bisect
 import collections
 import itertools
 import re
@@ -5,18 +7,17 @@ import re
 import pitches
 from rhythm import time
 
-RE_MAJOR = re.compile('^[A-Ga-g]([Bb]|#)?(maj)?$')
-RE_MINOR = re.compile('^[A-Ga-g]([Bb]|#)?(-|m(in)?)$')
-RE_SEVEN = re.compile('^[A-Ga-g]([Bb]|#)?7$')
-RE_DIMIN = re.compile('^[A-Ga-g]([Bb]|#)?dim$')
-RE_SLASH = re.compile('^[A-Ga-g]([Bb]|#)?(7(sus[24]?)?|-|m(in)?|dim|maj|sus[24]?)?/[A-Ga-g]([Bb]|#)?$')
-RE_SUS2 = re.compile('^[A-Ga-g]([Bb]|#)?(sus2)$')
-RE_SUS4 = re.compile('^[A-Ga-g]([Bb]|#)?(sus(4)?)$')
-RE_7SUS = re.compile('^[A-Ga-g]([Bb]|#)?7(sus(4)?)$')
+RE_CHORD = re.compile('^(?P<root>[A-Ga-g]([Bb]|#)?)'
+                      '(?P<quality>maj|-|m|min|7|dim|sus2|sus|sus4|7sus|7sus4)?'
+                      '(/(?P<bass>[A-Ga-g]([Bb]|#)?))?$')
 RE_CHORD_ROOT = re.compile('[A-Ga-g]([Bb]|#)?')
 
 
 __progression = None
+__timeline = None
+
+# (chord class, root pitch class, bass pitch class) -> Chord, shared across the whole process
+__interned = {}
 
 
 def __init():
@@ -35,11 +36,13 @@ def write(chord, measure=0, beat=0):
 
     sample_pos = time.measure(measure).beat(beat).start()
     __progression[sample_pos] = parsed
+    __invalidate()
 
 
 def clear():
     global __progression
     __progression = {}
+    __invalidate()
 
 
 def keys():
@@ -47,22 +50,39 @@ def keys():
 
 
 def get(position):
-    chord_or_none = __progression.get(position, None)
-
-    if chord_or_none is None:
-        k = __progression.keys()
-        k.sort()
-        k = reversed(k)
+    return timeline().get(position)
 
-        for key in k:
-            if position > key:
-                return __progression[key]
 
-    return chord_or_none
+def is_change(position):
+    """
+    :param position: sample position
+    :return: True if a chord is written at exactly this position
+    """
+    return timeline().is_change(position)
 
 
 def in_measure(measure):
-    return {key: __progression[key] for key in __progression.keys() if measure.start() <= key < measure.end()}
+    return dict(timeline().between(measure.start(), measure.end()))
+
+
+def timeline():
+    """
+    Returns the ChordTimeline of the current progression. It is built on first use after the progression changes
+    through write() or clear(), so once a song is loaded every lookup shares the same one.
+
+    :return: ChordTimeline
+    """
+    global __timeline
+
+    if __timeline is None:
+        __timeline = ChordTimeline(__progression)
+
+    return __timeline
+
+
+def __invalidate():
+    global __timeline
+    __timeline = None
 
 
 def progression():
@@ -70,22 +90,42 @@ def progression():
 
 
 def parse(chord, bass_note=None):
-    if RE_MAJOR.match(chord):
-        return MajorChord(get_root(chord), bass_note)
-    elif RE_MINOR.match(chord):
-        return MinorChord(get_root(chord), bass_note)
-    elif RE_SEVEN.match(chord):
-        return SevenChord(get_root(chord), bass_note)
-    elif RE_DIMIN.match(chord):
-        return DiminishedChord(get_root(chord), bass_note)
-    elif RE_SLASH.match(chord):
-        return parse(chord.split('/')[0], chord.split('/')[1])
-    elif RE_SUS2.match(chord):
-        return Sus2Chord(get_root(chord), bass_note)
-    elif RE_SUS4.match(chord):
-        return Sus4Chord(get_root(chord), bass_note)
-    elif RE_7SUS.match(chord):
-        return SevenSusChord(get_root(chord), bass_note)
+    """
+    Parses a chord symbol such as 'C', 'A-', 'D7sus' or 'G7/B'. Equal symbols return the same shared Chord object.
+
+    :param chord: chord symbol string
+    :param bass_note: bass note string, for chord symbols without a slash
+    :return: Chord object, or None if the symbol isn't recognized
+    """
+    match = RE_CHORD.match(chord)
+
+    if match is None:
+        return None
+
+    if match.group('bass') is not None:
+        bass_note = match.group('bass')
+
+    return interned(QUALITIES[match.group('quality')], match.group('root'), bass_note)
+
+
+def interned(chord_class, root, bass_note=None):
+    """
+    Returns the shared chord_class instance for the given root and bass note, building it on first use. Chords
+    are keyed by pitch class, so the returned chord's root and bass sit in the lowest octave.
+
+    :param chord_class: Chord subclass, e.g. MajorChord
+    :param root: root midi value, text value or Pitch object
+    :param bass_note: bass midi value, text value or Pitch object. Defaults to the root
+    :return: chord_class object
+    """
+    root_class = pitches.parse(root).midi() % 12
+    bass_class = root_class if bass_note is None else pitches.parse(bass_note).midi() % 12
+    key = (chord_class, root_class, bass_class)
+
+    if key not in __interned:
+        __interned[key] = chord_class(root_class, None if bass_note is None else bass_class)
+
+    return __interned[key]
 
 
 def get_root(chord):
@@ -102,6 +142,14 @@ def same(chord1, chord2):
 
 class Chord:
 
+    # Intervals above the root, by pitch class, which rule out or indicate a dominant or subdominant relationship.
+    # See indicates_dominant() and indicates_subdominant()
+    DOMINANT_BLACK_LIST = None
+    DOMINANT_MAJOR_INDICATORS = None
+    DOMINANT_MINOR_INDICATORS = None
+    SUBDOMINANT_BLACK_LIST = None
+    SUBDOMINANT_INDICATORS = None
+
     def __init__(self, root, bass_note=None):
         self._root = pitches.parse(root)
 
@@ -110,24 +158,15 @@ class Chord:
         else:
             self.bass_note = pitches.parse(bass_note)
 
+        self._dominant_masks = self.__interval_masks(self.DOMINANT_BLACK_LIST, self.DOMINANT_MAJOR_INDICATORS,
+                                                     self.DOMINANT_MINOR_INDICATORS)
+        self._subdominant_masks = self.__interval_masks(self.SUBDOMINANT_BLACK_LIST, self.SUBDOMINANT_INDICATORS)
+
     def __repr__(self):
         return self.string()
 
     def __contains__(self, note):
-        parsed = None
-
-        if isinstance(note, pitches.Pitch):
-            parsed = note
-        elif isinstance(note, int):
-            parsed = pitches.parse(note)
-
-        if parsed.species() == self._root.species():
-            return True
-        if parsed.species() == self.three().species():
-            return True
-        if parsed.species() == self.five().species():
-            return True
-        return False
+        return bool(pitches.pitch_class_mask(note) & self._mask)
 
     def __eq__(self, other):
         if not isinstance(other, self.__class__):
@@ -181,13 +220,61 @@ class Chord:
         """
         raise NotImplementedError
 
+    def mask(self):
+        """
+        Returns the 12-bit pitch class mask of this chord's degrees. See pitches.pitch_class_mask()
+        """
+        return self._mask
+
+    def scale_mask(self):
+        """
+        Returns the 12-bit pitch class mask of this chord's chord scale
+        """
+        return self._scale_mask
+
+    def in_scale(self, pitch):
+        """
+        Equivalent to pitch in self.scale(), without building the scale
+
+        :param pitch: midi value
+        """
+        return 0 <= pitch <= 127 and bool(1 << (pitch % 12) & self._scale_mask)
+
+    def scale_between(self, low, high):
+        """
+        Equivalent to [p for p in self.scale() if low <= p <= high], found by bisection
+
+        :param low: midi value or Pitch, inclusive
+        :param high: midi value or Pitch, inclusive
+        :return: tuple of midi values
+        """
+        return pitches.scale_between(self.scale(), low, high)
+
+    def chord_tone_count(self, *values):
+        """
+        Returns the number of distinct pitch classes among the submitted midi values which are degrees of this chord.
+        Negative values (rests) are ignored.
+
+        :param values: midi values
+        """
+        return pitches.MASK_BIT_COUNTS[pitches.pitch_class_mask(*[v for v in values if v >= 0]) & self._mask]
+
     def indicates_dominant(self, *pitches):
         """
-        Returns whether the pitches submitted indicate a dominant relationship to this chord
+        Returns whether the pitches submitted indicate a dominant relationship to this chord: none of them on the
+        black list, exactly one of them a major indicator and at least one a minor indicator
 
         :param pitches: array of pitches
         """
-        raise NotImplementedError
+        if self._dominant_masks is None:
+            raise NotImplementedError
+
+        black_list, major_indicators, minor_indicators = self._dominant_masks
+        bits = [1 << (p % 12) for p in pitches]
+
+        return not [bit for bit in bits if bit & black_list] \
+            and len([bit for bit in bits if bit & major_indicators]) == 1 \
+            and len([bit for bit in bits if bit & minor_indicators]) >= 1
 
     def all_degrees(self):
         return self.root(), self.three(), self.five()
@@ -203,11 +290,30 @@ class Chord:
 
     def indicates_subdominant(self, *pitches):
         """
-        Returns whether the pitches submitted indicate a subdominant relationship to this chord
+        Returns whether the pitches submitted indicate a subdominant relationship to this chord: none of them on the
+        black list and at least two of them indicators
 `
         :param pitches: array of pitches
         """
-        raise NotImplementedError
+        if self._subdominant_masks is None:
+            raise NotImplementedError
+
+        black_list, indicators = self._subdominant_masks
+        bits = [1 << (p % 12) for p in pitches]
+
+        return not [bit for bit in bits if bit & black_list] \
+            and len([bit for bit in bits if bit & indicators]) >= 2
+
+    def _compute_masks(self):
+        self._mask = pitches.pitch_class_mask(*self.all_degrees())
+        self._scale_mask = pitches.pitch_class_mask(*self.scale())
+
+    def __interval_masks(self, *interval_lists):
+        if None in interval_lists:
+            return None
+
+        return tuple(pitches.pitch_class_mask(*[self._root.midi() + i for i in intervals])
+                     for intervals in interval_lists)
 
     def _compute_octaves(self):
         all_notes = list(itertools.chain(
@@ -223,11 +329,18 @@ class Chord:
 
 class Sus2Chord(Chord):
 
+    DOMINANT_BLACK_LIST = (0, 6, 10)
+    DOMINANT_MAJOR_INDICATORS = (11, 7)
+    DOMINANT_MINOR_INDICATORS = (2, 5)
+    SUBDOMINANT_BLACK_LIST = (4, 11)
+    SUBDOMINANT_INDICATORS = (2, 5, 9)
+
     def __init__(self, root_note, bass_note=None):
         Chord.__init__(self, root_note, bass_note)
         self.__two = pitches.parse(self._root.midi() + 2)
         self.__five = pitches.parse(self._root.midi() + 7)
         self._all_octaves = self._compute_octaves()
+        self._compute_masks()
 
     def three(self):
         return self.__two
@@ -241,34 +354,21 @@ class Sus2Chord(Chord):
     def string(self):
         return pitches.species(self._root)
 
-    def indicates_dominant(self, *pitches):
-        root_pitch = self._root.midi()
-
-        black_list = (root_pitch % 12, (root_pitch + 6) % 12, (root_pitch + 10) % 12)
-        major_indicators = (root_pitch + 11) % 12, (root_pitch + 7) % 12
-        minor_indicators = (root_pitch + 2) % 12, (root_pitch + 5) % 12
-
-        return len([p for p in pitches if (p % 12) in black_list]) == 0 \
-            and len([p for p in pitches if (p % 12) in major_indicators]) == 1 \
-            and len([p for p in pitches if (p % 12) in minor_indicators]) >= 1
-
-    def indicates_subdominant(self, *pitches):
-        root_pitch = self._root.midi()
-
-        black_list = ((root_pitch + 4) % 12, (root_pitch + 11) % 12)
-        indicators = ((root_pitch + 2) % 12, (root_pitch + 5) % 12, (root_pitch + 9) % 12)
-
-        return len([p for p in pitches if (p % 12) in black_list]) == 0 \
-               and len([p for p in pitches if (p % 12) in indicators]) >= 2
-
 
 class Sus4Chord(Chord):
 
+    DOMINANT_BLACK_LIST = (0, 6, 10)
+    DOMINANT_MAJOR_INDICATORS = (11, 7)
+    DOMINANT_MINOR_INDICATORS = (2, 5)
+    SUBDOMINANT_BLACK_LIST = (4, 11)
+    SUBDOMINANT_INDICATORS = (2, 5, 9)
+
     def __init__(self, root_note, bass_note=None):
         Chord.__init__(self, root_note, bass_note)
         self.__four = pitches.parse(self._root.midi() + 5)
         self.__five = pitches.parse(self._root.midi() + 7)
         self._all_octaves = self._compute_octaves()
+        self._compute_masks()
 
     def three(self):
         return self.__four
@@ -282,34 +382,21 @@ class Sus4Chord(Chord):
     def string(self):
         return pitches.species(self._root)
 
-    def indicates_dominant(self, *pitches):
-        root_pitch = self._root.midi()
-
-        black_list = (root_pitch % 12, (root_pitch + 6) % 12, (root_pitch + 10) % 12)
-        major_indicators = (root_pitch + 11) % 12, (root_pitch + 7) % 12
-        minor_indicators = (root_pitch + 2) % 12, (root_pitch + 5) % 12
-
-        return len([p for p in pitches if (p % 12) in black_list]) == 0 \
-               and len([p for p in pitches if (p % 12) in major_indicators]) == 1 \
-               and len([p for p in pitches if (p % 12) in minor_indicators]) >= 1
-
-    def indicates_subdominant(self, *pitches):
-        root_pitch = self._root.midi()
-
-        black_list = ((root_pitch + 4) % 12, (root_pitch + 11) % 12)
-        indicators = ((root_pitch + 2) % 12, (root_pitch + 5) % 12, (root_pitch + 9) % 12)
-
-        return len([p for p in pitches if (p % 12) in black_list]) == 0 \
-               and len([p for p in pitches if (p % 12) in indicators]) >= 2
-
 
 class MajorChord(Chord):
 
+    DOMINANT_BLACK_LIST = (0, 6, 10)
+    DOMINANT_MAJOR_INDICATORS = (11, 7)
+    DOMINANT_MINOR_INDICATORS = (2, 5)
+    SUBDOMINANT_BLACK_LIST = (4, 11)
+    SUBDOMINANT_INDICATORS = (2, 5, 9)
+
     def __init__(self, root_note, bass_note=None):
         Chord.__init__(self, root_note, bass_note)
         self.__three = pitches.parse(self._root.midi() + 4)
         self.__five = pitches.parse(self._root.midi() + 7)
         self._all_octaves = self._compute_octaves()
+        self._compute_masks()
 
     def three(self):
         return self.__three
@@ -323,34 +410,21 @@ class MajorChord(Chord):
     def string(self):
         return pitches.species(self._root)
 
-    def indicates_dominant(self, *pitches):
-        root_pitch = self._root.midi()
-
-        black_list = (root_pitch % 12, (root_pitch + 6) % 12, (root_pitch + 10) % 12)
-        major_indicators = (root_pitch + 11) % 12, (root_pitch + 7) % 12
-        minor_indicators = (root_pitch + 2) % 12, (root_pitch + 5) % 12
-
-        return len([p for p in pitches if (p % 12) in black_list]) == 0 \
-            and len([p for p in pitches if (p % 12) in major_indicators]) == 1 \
-            and len([p for p in pitches if (p % 12) in minor_indicators]) >= 1
-
-    def indicates_subdominant(self, *pitches):
-        root_pitch = self._root.midi()
-
-        black_list = ((root_pitch + 4) % 12, (root_pitch + 11) % 12)
-        indicators = ((root_pitch + 2) % 12, (root_pitch + 5) % 12, (root_pitch + 9) % 12)
-
-        return len([p for p in pitches if (p % 12) in black_list]) == 0 \
-               and len([p for p in pitches if (p % 12) in indicators]) >= 2
-
 
 class MinorChord(Chord):
 
+    DOMINANT_BLACK_LIST = (0, 10)
+    DOMINANT_MAJOR_INDICATORS = (11, )
+    DOMINANT_MINOR_INDICATORS = (2, 5, 7, 8)
+    SUBDOMINANT_BLACK_LIST = (10, 11)
+    SUBDOMINANT_INDICATORS = (2, 5, 8)
+
     def __init__(self, root_note, bass_note=None):
         Chord.__init__(self, root_note, bass_note)
         self.__three = pitches.parse(self._root.midi() + 3)
         self.__five = pitches.parse(self._root.midi() + 7)
         self._all_octaves = self._compute_octaves()
+        self._compute_masks()
 
     def three(self):
         return self.__three
@@ -364,44 +438,11 @@ class MinorChord(Chord):
     def scale(self):
         return pitches.aeolian(self._root.midi())
 
-    def indicates_dominant(self, *pitches):
-        root_pitch = self._root.midi()
-
-        black_list = (root_pitch % 12, (root_pitch + 10) % 12)
-        major_indicators = ((root_pitch + 11) % 12,)
-        minor_indicators = ((root_pitch + 2) % 12, (root_pitch + 5) % 12, (root_pitch + 7) % 12, (root_pitch + 8) % 12)
-
-        return len([p for p in pitches if (p % 12) in black_list]) == 0 \
-            and len([p for p in pitches if (p % 12) in major_indicators]) == 1 \
-            and len([p for p in pitches if (p % 12) in minor_indicators]) >= 1
-
-    def indicates_subdominant(self, *pitches):
-        root_pitch = self._root.midi()
-
-        black_list = ((root_pitch + 10) % 12, (root_pitch + 11) % 12)
-        indicators = ((root_pitch + 2) % 12, (root_pitch + 5) % 12, (root_pitch + 8) % 12)
-
-        return len([p for p in pitches if (p % 12) in black_list]) == 0 \
-               and len([p for p in pitches if (p % 12) in indicators]) >= 2
-
 
 class SevenSusChord(Sus4Chord):
     def __init__(self, root_note, bass_note=None):
         self.__seven = pitches.parse(pitches.parse(root_note).midi() + 10)
         Sus4Chord.__init__(self, root_note, bass_note)
-        self._all_octaves = self._compute_octaves()
-
-    def __contains__(self, note):
-        parsed = None
-
-        if isinstance(note, pitches.Pitch):
-            parsed = note
-        elif isinstance(note, int):
-            parsed = pitches.parse(note)
-
-        if parsed.species() == self.__seven.species():
-            return True
-        return Chord.__contains__(self, parsed)
 
     def string(self):
         return pitches.species(self._root) + '7sus'
@@ -432,19 +473,6 @@ class SevenChord(MajorChord):
     def __init__(self, root_note, bass_note=None):
         self.__seven = pitches.parse(pitches.parse(root_note).midi() + 10)
         MajorChord.__init__(self, root_note, bass_note)
-        self._all_octaves = self._compute_octaves()
-
-    def __contains__(self, note):
-        parsed = None
-
-        if isinstance(note, pitches.Pitch):
-            parsed = note
-        elif isinstance(note, int):
-            parsed = pitches.parse(note)
-
-        if parsed.species() == self.__seven.species():
-            return True
-        return Chord.__contains__(self, parsed)
 
     def string(self):
         return pitches.species(self._root) + '7'
@@ -476,19 +504,6 @@ class DiminishedChord(MinorChord):
         self.__five = pitches.parse(pitches.parse(root_note).midi() + 6)
         self.__seven = pitches.parse(pitches.parse(root_note).midi() + 9)
         MinorChord.__init__(self, root_note, bass_note)
-        self._all_octaves = self._compute_octaves()
-
-    def __contains__(self, note):
-        parsed = None
-
-        if isinstance(note, pitches.Pitch):
-            parsed = note
-        elif isinstance(note, int):
-            parsed = pitches.parse(note)
-
-        if parsed.species() == self.__seven.species():
-            return True
-        return Chord.__contains__(self, parsed)
 
     def five(self):
         return self.__five
@@ -520,6 +535,97 @@ class DiminishedChord(MinorChord):
         return False
 
 
+# RE_CHORD quality suffix -> Chord subclass
+QUALITIES = {
+    None: MajorChord,
+    'maj': MajorChord,
+    '-': MinorChord,
+    'm': MinorChord,
+    'min': MinorChord,
+    '7': SevenChord,
+    'dim': DiminishedChord,
+    'sus2': Sus2Chord,
+    'sus': Sus4Chord,
+    'sus4': Sus4Chord,
+    '7sus': SevenSusChord,
+    '7sus4': SevenSusChord
+}
+
+
+class ChordTimeline:
+    """
+    Frozen, sorted view of a chord progression. Chords can be looked up at arbitrary positions by bisecting the
+    change points, or per beat through a dense array of chord ids which is laid out against the time grid on first
+    use.
+    """
+
+    def __init__(self, progression):
+        self._positions = sorted(progression.keys())
+        self._chords = [progression[position] for position in self._positions]
+        self._changes = frozenset(self._positions)
+        self._beat_chord_ids = None
+        self._palette = []
+
+    def get(self, position):
+        """
+        :param position: sample position
+        :return: the chord sounding at position, or None if position is before the first chord
+        """
+        index = bisect.bisect_right(self._positions, position) - 1
+
+        return self._chords[index] if index >= 0 else None
+
+    def is_change(self, position):
+        return position in self._changes
+
+    def between(self, start, end):
+        """
+        :param start: sample position, inclusive
+        :param end: sample position, exclusive
+        :return: sorted list of (position, chord) for the chords written within [start, end)
+        """
+        first = bisect.bisect_left(self._positions, start)
+        last = bisect.bisect_left(self._positions, end)
+
+        return zip(self._positions[first:last], self._chords[first:last])
+
+    def palette(self):
+        """
+        :return: list of the distinct chords in the progression, indexed by the ids in beat_chord_ids()
+        """
+        self.beat_chord_ids()
+
+        return self._palette
+
+    def beat_chord_ids(self):
+        """
+        :return: array of chord ids (see palette()) by beat index, -1 for beats before the first chord
+        """
+        if self._beat_chord_ids is None:
+            ids = {}
+            self._beat_chord_ids = array.array('h')
+            index = -1
+
+            for i in range(time.beat_count()):
+                start = time.beat_at_index(i).start()
+                while index + 1 < len(self._positions) and self._positions[index + 1] <= start:
+                    index += 1
+
+                if index < 0:
+                    self._beat_chord_ids.append(-1)
+                    continue
+
+                # Parsed chords are interned, so identity is enough to tell them apart
+                chord = self._chords[index]
+                if id(chord) not in ids:
+                    ids[id(chord)] = len(self._palette)
+                    self._palette.append(chord)
+
+                self._beat_chord_ids.append(ids[id(chord)])
+
+        return self._beat_chord_ids
+
+
 class ChordProgression(collections.MutableMapping):
 
     def __init__(self, *args, **kwargs):
@@ -8,6 +8,9 @@ song_length = 0
 minimum_time_divisor = 4
 maximum_strong_beat_subdivisions = 3
 
+# partial arrangements kept per strong beat by progression.BeamPicker
+beam_width = 8
+
 
 def minimum_time_unit():
     """
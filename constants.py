@@ -10,6 +10,7 @@ ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 TEST_MIDI = ROOT_DIR + '/test/midi/'
 EXAMPLES = ROOT_DIR + '/examples/'
 OUT_DIR = ROOT_DIR + '/out/'
+VOICING_CACHE = ROOT_DIR + '/.voicing_cache'
 
 EIGHTH_NOTE = config.resolution / 2
 DOTTED_EIGHTH_NOTE = int(EIGHTH_NOTE * 1.5)
@@ -6,7 +6,7 @@ CYBACH
 import os.path
 import re
 import sys
-from itertools import chain
+from itertools import islice, izip
 
 import midi
 
@@ -16,14 +16,19 @@ import examples
 import fileloader
 import transforms
 import note_picker
+import progression
 import sequences
+import util
+import voicing_cache
 from rhythm import time
 
 # ~~~~~~~~ verify command line arguments ~~~~~~~~
 midi_regex = re.compile('.+\.(midi|mid)')
 
+PICKERS = ('greedy', 'viterbi', 'beam')
+
 if len(sys.argv) < 2:
-    print 'Usage: cybach.py {<midi_file_name>|examples}'
+    print 'Usage: cybach.py {<midi_file_name>|examples} [' + '|'.join(PICKERS) + ']'
     exit(2)
 
 if sys.argv[1] == 'examples':
@@ -42,6 +47,10 @@ if re.match(midi_regex, sys.argv[1]) and not os.path.isfile(sys.argv[1]):
     print 'File or example ' + sys.argv[1] + ' does not exist'
     exit(2)
 
+if len(sys.argv) > 2 and sys.argv[2] not in PICKERS:
+    print 'Note picker must be one of: ' + ', '.join(PICKERS)
+    exit(2)
+
 # ~~~~~~~~ load midi and initialize parts ~~~~~~~~
 print 'Parsing MIDI and initializing...'
 fileloader.load(sys.argv[1], False)
@@ -50,30 +59,32 @@ fileloader.load(sys.argv[1], False)
 # ~~~~~~~~ (quarter notes for 4/4, eights for 6/8) ~~~~~~~~
 
 print 'Selecting initial accompaniment...'
-picker = note_picker.NotePicker()
+if len(sys.argv) > 2 and sys.argv[2] == 'viterbi':
+    progression.write_arrangement(progression.ProgressionPicker().compute())
+elif len(sys.argv) > 2 and sys.argv[2] == 'beam':
+    progression.write_arrangement(progression.BeamPicker().compute())
+else:
+    picker = note_picker.NotePicker(batched=True)
 
-keys = time.measures().keys()
-keys.sort()
-strong_beats = list(chain.from_iterable([time.measures()[key].strong_beats() for key in keys]))
-for i in range(len(strong_beats)):
-    beat = strong_beats[i]
-    pitches = picker.compute(beat)
-    start = beat.start()
-    end = config.song_length if beat.end() == config.song_length else strong_beats[i + 1].start()
+    for beat, next_beat in util.with_next(time.iter_strong_beats()):
+        pitches = picker.compute(beat)
+        start = beat.start()
+        end = config.song_length if next_beat is None else next_beat.start()
 
-    bass_note = sequences.Note(sequences.bass(), start, end, pitches[note_picker.BASS_POSITION])
-    tenor_note = sequences.Note(sequences.tenor(), start, end, pitches[note_picker.TENOR_POSITION])
-    alto_note = sequences.Note(sequences.alto(), start, end, pitches[note_picker.ALTO_POSITION])
+        bass_note = sequences.Note(sequences.bass(), start, end, pitches[note_picker.BASS_POSITION])
+        tenor_note = sequences.Note(sequences.tenor(), start, end, pitches[note_picker.TENOR_POSITION])
+        alto_note = sequences.Note(sequences.alto(), start, end, pitches[note_picker.ALTO_POSITION])
 
-    sequences.bass().add_entities(bass_note)
-    sequences.tenor().add_entities(tenor_note)
-    sequences.alto().add_entities(alto_note)
+        sequences.bass().add_entities(bass_note)
+        sequences.tenor().add_entities(tenor_note)
+        sequences.alto().add_entities(alto_note)
 
+voicing_cache.save()
 
 # ~~~~~~~~ Increase or decrease motion by grouping notes together or adding inter-beat motion ~~~~~~~~
 
 
-for last_beat, this_beat in zip(strong_beats, strong_beats[1:]):
+for last_beat, this_beat in izip(time.iter_strong_beats(), islice(time.iter_strong_beats(), 1, None)):
     t = transforms.get_all_transforms(last_beat.start(), this_beat.start(), 3)
     print 'yo'
 
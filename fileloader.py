@@ -227,9 +227,7 @@ def __offer_part_customization():
 
 
 def __correct_song_length():
-    keys = time.measures().keys()
-    keys.sort()
-    config.song_length = time.measures()[keys[-1]].end()
+    config.song_length = time.measure(-1).end()
 
 
 def __load_time_signature_events(pattern):
@@ -239,8 +237,7 @@ def __load_time_signature_events(pattern):
     :param pattern: pattern retrieved by parsing MIDI
     """
     events = pat_util.get_time_signature_events(pattern)
-    for key in events.keys():
-        time.add_signature(key, time.TimeSignature(event=events[key]))
+    time.set_signatures({key: time.TimeSignature(event=events[key]) for key in events.keys()})
 
 
 def __enforce_midi_validity(pattern):
@@ -0,0 +1,123 @@
+"""
+Song-wide table of the harmonic context of every beat: the chords sounding on, before and after it, the soprano pitch,
+and where it falls in the measure and the song. Scoring stages read these facts from the table by beat index rather
+than looking each one up through chords, sequences and time for every candidate.
+
+The table is laid out once after a song is loaded, and laid out again whenever the chord progression, the soprano or
+the song length it was built from change.
+"""
+
+import numpy as np
+
+import chords
+import config
+import sequences
+from rhythm import time
+
+__timeline = None
+
+
+def timeline():
+    """
+    :return: HarmonicTimeline of the loaded song
+    """
+    global __timeline
+
+    if __timeline is None or not __timeline.is_current():
+        __timeline = HarmonicTimeline()
+
+    return __timeline
+
+
+def clear():
+    global __timeline
+    __timeline = None
+
+
+class HarmonicTimeline:
+    """
+    Columns indexed by beat index (see time.beat_index()). Chords are stored as ids into palette(), -1 where there is
+    none.
+    """
+
+    def __init__(self):
+        self._chord_timeline = chords.timeline()
+        self._soprano_sequence = sequences.soprano()
+        self._song_length = config.song_length
+
+        beats = [time.beat_at_index(i) for i in range(time.beat_count())]
+
+        self._chord_ids = np.array(self._chord_timeline.beat_chord_ids(), dtype=np.int16)
+        self._previous_chord_ids = np.concatenate((self._chord_ids[:1], self._chord_ids[:-1]))
+        self._next_chord_ids = np.concatenate((self._chord_ids[1:], [-1])).astype(np.int16)
+
+        self._soprano = np.array([self.__soprano_value(beat) for beat in beats], dtype=np.int16)
+        self._first_beats = np.array([beat.first_beat() for beat in beats], dtype=bool)
+        self._song_ends = np.array([beat.end() == config.song_length for beat in beats], dtype=bool)
+        self._isolated_changes = np.array([self.__is_isolated_change(beat) for beat in beats], dtype=bool)
+
+    def is_current(self):
+        """
+        :return: False if the chord progression, soprano or song length changed since the table was laid out
+        """
+        return self._chord_timeline is chords.timeline() and self._soprano_sequence is sequences.soprano() and \
+            self._song_length == config.song_length
+
+    def palette(self):
+        return self._chord_timeline.palette()
+
+    def chord_ids(self):
+        return self._chord_ids
+
+    def previous_chord_ids(self):
+        """
+        :return: id of the chord sounding on the beat before each beat. The first beat counts as its own previous beat
+        """
+        return self._previous_chord_ids
+
+    def next_chord_ids(self):
+        return self._next_chord_ids
+
+    def soprano(self):
+        """
+        :return: midi value of the soprano at the start of each beat, -1 where it rests
+        """
+        return self._soprano
+
+    def first_beats(self):
+        return self._first_beats
+
+    def song_ends(self):
+        """
+        :return: whether each beat ends the song
+        """
+        return self._song_ends
+
+    def isolated_changes(self):
+        """
+        :return: whether the chord changes at each beat but neither on the beat before nor on the one after
+        """
+        return self._isolated_changes
+
+    def chord(self, index):
+        return self.__palette_chord(self._chord_ids[index])
+
+    def previous_chord(self, index):
+        return self.__palette_chord(self._previous_chord_ids[index])
+
+    def next_chord(self, index):
+        return self.__palette_chord(self._next_chord_ids[index])
+
+    def __palette_chord(self, chord_id):
+        return self.palette()[chord_id] if chord_id >= 0 else None
+
+    def __soprano_value(self, beat):
+        if self._soprano_sequence.is_rest(beat.start()):
+            return -1
+
+        return self._soprano_sequence.pitch(beat.start()).midi()
+
+    def __is_isolated_change(self, beat):
+        return self._chord_timeline.is_change(beat.start()) and \
+            not self._chord_timeline.is_change(beat.start() - beat.length()) and \
+            not self._chord_timeline.is_change(beat.end())
@@ -1,3 +1,4 @@
+import parts
 import pitches
 
 
@@ -13,6 +14,14 @@ class Instrument:
     def __repr__(self):
         return 'Max low pitch: %d // Max high pitch: %d' % (self.max_low_pitch, self.max_high_pitch)
 
+    def register_scores(self, avoids_low=False):
+        """
+        :param avoids_low: whether the instrument's part prefers to stay away from the bottom of the range rather than
+                           the top, see parts.Part
+        :return: parts.register_scores() table of the instrument's range
+        """
+        return parts.register_scores(self.max_low_pitch, self.max_high_pitch, avoids_low)
+
     def lowest_comfy(self, note):
         text = note.species()
         octaves = pitches.OCTAVES[text]
@@ -0,0 +1,59 @@
+"""
+Vectorized counterparts of the scalar interval checks in pitches.py. Every function takes array-likes of midi values
+which broadcast against each other, e.g. one column per candidate, and returns a boolean numpy array.
+"""
+
+import numpy as np
+
+# interval classes (semitones mod 12) which make parallel movement objectionable: octave/unison, fourth, fifth
+PERFECT_INTERVAL_CLASSES = (0, 5, 7)
+
+# interval class -> whether it is perfect
+PERFECT = np.zeros(12, dtype=bool)
+PERFECT[list(PERFECT_INTERVAL_CLASSES)] = True
+
+# midi value used for rests in candidate arrays
+REST = -1
+
+
+def parallel_perfect(first_previous, first_next, second_previous, second_next):
+    """
+    Mask of where two voices move in parallel by a perfect interval. Equivalent to pitches.parallel_movement()
+    applied elementwise.
+
+    :param first_previous: previous midi values of the first voice
+    :param first_next: next midi values of the first voice
+    :param second_previous: previous midi values of the second voice
+    :param second_next: next midi values of the second voice
+    :return: boolean array
+    """
+    first_difference = np.subtract(first_previous, second_previous)
+    second_difference = np.subtract(first_next, second_next)
+
+    return (first_difference == second_difference) & PERFECT[np.mod(first_difference, 12)]
+
+
+def dissonant(first, second):
+    """
+    Mask of where two pitches are a minor second (or minor ninth, etc.) apart. Equivalent to old_transforms.dissonant()
+    applied elementwise.
+
+    :param first: midi values
+    :param second: midi values
+    :return: boolean array
+    """
+    return np.mod(np.abs(np.subtract(first, second)), 12) == 1
+
+
+def crossed(lower, upper):
+    """
+    Mask of where a voice which should sit lower is above the voice which should sit above it. Rests in the upper
+    voice never cross, matching note_picker.parts_dont_cross().
+
+    :param lower: midi values of the lower voice
+    :param upper: midi values of the upper voice
+    :return: boolean array
+    """
+    upper = np.asarray(upper)
+
+    return (np.asarray(lower) > upper) & (upper != REST)
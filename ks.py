@@ -152,6 +152,9 @@ class _KeySignature:
     def scale(self):
         return self.root_chord.scale()
 
+    def in_scale(self, pitch):
+        return self.root_chord.in_scale(pitch)
+
     def one(self):
         return self.root_chord.root()
 
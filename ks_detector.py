@@ -1,5 +1,6 @@
 import chords
 import config
+import harmony
 import ks
 import pitches
 import util
@@ -95,6 +96,4 @@ def __time_coef(sample_index, segment_start):
     if sample_index == 0 or sample_index == segment_start:
         return vars.FIRST_BEAT_COEF
 
-    beat = time.beat_at_position(sample_index)
-
-    return vars.BEAT_ONE_COEF if beat.first_beat() else 1.0
+    return vars.BEAT_ONE_COEF if harmony.timeline().first_beats()[time.beat_index(sample_index)] else 1.0
@@ -166,15 +166,23 @@ class Motionizer:
 
 
 def note_duration_at_position(position, sequence):
+    """
+    Counts the beats, starting at position, for which sequence holds the pitch it has at position
+
+    :param position: sample position
+    :param sequence: sequences.Sequence
+    :return: number of beats
+    """
     duration = 0
 
-    pitch = sequence[position].midi()
-    for i in range(position, len(sequence)):
-        if i % config.resolution == 0 and sequence[i].midi() == pitch:
-            duration += 1
-        elif i % config.resolution == 0 and sequence[i].midi() != pitch:
+    pitch = sequence.entity(position).pitch().midi()
+    for entity in sequence.entities_overlapping(position, config.song_length):
+        if entity.pitch().midi() != pitch:
             break
 
+        start = max(entity.start(), position)
+        duration += (entity.end() - 1) // config.resolution - (start - 1) // config.resolution
+
     return duration
 
 
@@ -1,33 +1,84 @@
+import numpy as np
+
 import chords
-import config
 import entity_util
+import harmony
+import intervals
 import parts
 import pitches
 import sequences
 import transforms
-import util
 import vars
+import voicing_cache
+from rhythm import time
 
 ALTO_POSITION = 0
 TENOR_POSITION = 1
 BASS_POSITION = 2
 SOPRANO_POSITION = 3
 
+# stands in for a pitch in voice histories where the entity there isn't a note, e.g. before the first beat. Distinct
+# from -1, which accompaniment notes use for rests
+NO_NOTE = -2
+
+# (first, second) voice pairs tested for parallel movement, in the order parallel_motion_score() tests them
+PARALLEL_PAIRS = ((ALTO_POSITION, SOPRANO_POSITION), (TENOR_POSITION, SOPRANO_POSITION),
+                  (BASS_POSITION, SOPRANO_POSITION), (ALTO_POSITION, TENOR_POSITION),
+                  (TENOR_POSITION, BASS_POSITION), (BASS_POSITION, ALTO_POSITION))
+
 
 class NotePicker:
-    def __init__(self):
+    def __init__(self, batched=False, bounded=False):
+        """
+        :param batched: score all of a beat's candidates at once with score_all() rather than one at a time with
+                        score(). Both pick the same notes.
+        :param bounded: find the best candidate with a BoundedSearch, which skips scoring voicings that can't beat
+                        the best one found so far. Picks the same notes as scoring every candidate.
+
+        Whichever way candidates are scored, ties go to the earliest candidate of get_candidate_matrix().
+        """
         self.beat = None
+        self.batched = batched
+        self.bounded = bounded
+        # search nodes expanded and pruned by bounded picks so far
+        self.expanded = 0
+        self.pruned = 0
 
     def compute(self, beat):
-        if sequences.soprano().is_rest(beat.start()):
-            soprano_pitch = -1
-        else:
-            soprano_pitch = sequences.soprano().pitch(beat.start()).midi()
+        soprano_pitch = int(harmony.timeline().soprano()[time.beat_index(beat.start())])
+
+        if self.bounded:
+            search = BoundedSearch(beat, get_candidate_array(beat, soprano_pitch))
+            best = search.best()
+            self.expanded += search.expanded
+            self.pruned += search.pruned
+
+            return min(best, key=candidate_order) if best else None
 
         candidates = get_candidate_matrix(beat, soprano_pitch)
-        scored = {tuple(candidate): self.score(beat, candidate) for candidate in candidates}
 
-        return util.key_for_highest_value(scored)
+        if not candidates:
+            return None
+
+        if self.batched:
+            scores = self.score_all(beat, candidates).tolist()
+        else:
+            scores = [self.score(beat, candidate) for candidate in candidates]
+
+        return tuple(candidates[scores.index(max(scores))])
+
+    def score_all(self, beat, candidates):
+        """
+        Batched score(), assembled from the beat's ScoreTables. Every score is bit-for-bit equal to score() for the
+        same candidate.
+
+        :param beat: time.Beat being picked for
+        :param candidates: list of candidates as built by get_candidate_matrix()
+        :return: numpy array of scores, one per candidate
+        """
+        candidates = np.array(candidates)
+
+        return ScoreTables(beat, candidates).score_all(candidates)
 
     def score(self, beat, candidate):
         bass_score = get_bass_score(candidate[BASS_POSITION], beat)
@@ -42,14 +93,329 @@ class NotePicker:
         return sum([bass_score, tenor_score, alto_score, harmony_score, motion_score, rest_penalty, duplicate_penalty])
 
 
+class ScoreTables:
+    """
+    The terms of score() for one beat, factored by what they depend on. Per-voice scores depend on a single pitch
+    and are tabled once per distinct pitch of each voice. Parallel motion depends on two voices' pitches and is
+    tabled per voice pair, over the distinct pitches of both. Harmony, rest and duplicate terms depend on the whole
+    voicing and are computed per candidate with NumPy. Scoring a candidate then costs a few table lookups.
+    """
+
+    def __init__(self, beat, candidates):
+        """
+        :param beat: time.Beat being picked for
+        :param candidates: 2d numpy array of the candidates the tables must cover, as built by get_candidate_matrix()
+        """
+        self.beat = beat
+        self.pitches = {}
+        self._slots = {}
+
+        for position in range(candidates.shape[1]):
+            self.pitches[position] = np.unique(candidates[:, position])
+            self._slots[position] = np.zeros(129, dtype=int)
+            self._slots[position][self.pitches[position] + 1] = np.arange(len(self.pitches[position]))
+
+        self.unary = {}
+        for position, sequence, beat_score in ((BASS_POSITION, sequences.bass(), get_bass_beat_score),
+                                               (TENOR_POSITION, sequences.tenor(), get_tenor_beat_score),
+                                               (ALTO_POSITION, sequences.alto(), get_alto_beat_score)):
+            history = voice_history(beat, sequence)
+            tendency = sequence.motion_tendency()
+
+            self.unary[position] = np.array([get_voice_score(pitch, beat_score(pitch, beat), history, tendency)
+                                             for pitch in self.pitches[position].tolist()])
+        self.pairwise = self.__parallel_motion_tables()
+
+    def slots(self, candidates, position):
+        """
+        :return: the index into self.pitches[position], and so into that voice's tables, of each candidate's pitch
+        """
+        return self._slots[position][candidates[:, position] + 1]
+
+    def slot(self, position, pitch):
+        """
+        :return: the index into self.pitches[position], and so into that voice's tables, of a single pitch
+        """
+        return self._slots[position][pitch + 1]
+
+    def score_all(self, candidates):
+        """
+        :param candidates: 2d numpy array of candidates covered by the tables
+        :return: numpy array of scores, one per candidate, added up in the same order as score()
+        """
+        slots = {position: self.slots(candidates, position) for position in self._slots}
+
+        bass_score = self.unary[BASS_POSITION][slots[BASS_POSITION]]
+        tenor_score = self.unary[TENOR_POSITION][slots[TENOR_POSITION]]
+        alto_score = self.unary[ALTO_POSITION][slots[ALTO_POSITION]]
+        harmony_score = get_harmony_scores(candidates, self.beat)
+        duplicate_penalty = get_duplicate_penalties(candidates)
+        rest_penalty = get_rest_penalties(candidates)
+
+        motion_score = np.zeros(len(candidates))
+        for first, second in PARALLEL_PAIRS:
+            motion_score += self.pairwise[(first, second)][slots[first], slots[second]]
+
+        return bass_score + tenor_score + alto_score + harmony_score + motion_score + rest_penalty + duplicate_penalty
+
+    def __parallel_motion_tables(self):
+        """
+        :return: dict of (first, second) voice pair (see PARALLEL_PAIRS) -> 2d numpy array of the pair's parallel
+                 motion penalty, indexed by the first and second voice's slots
+        """
+        last_beat = self.beat.previous()
+        tables = {}
+
+        previous = [0] * 4
+        if last_beat is not None:
+            previous[ALTO_POSITION] = sequences.alto().pitch(last_beat.start()).midi()
+            previous[TENOR_POSITION] = sequences.tenor().pitch(last_beat.start()).midi()
+            previous[BASS_POSITION] = sequences.bass().pitch(last_beat.start()).midi()
+            previous[SOPRANO_POSITION] = sequences.soprano().pitch(last_beat.start()).midi()
+
+        for first, second in PARALLEL_PAIRS:
+            shape = (len(self.pitches[first]), len(self.pitches[second]))
+
+            if last_beat is None:
+                tables[(first, second)] = np.zeros(shape)
+                continue
+
+            parallel = intervals.parallel_perfect(previous[first], self.pitches[first][:, np.newaxis],
+                                                  previous[second], self.pitches[second][np.newaxis, :])
+            tables[(first, second)] = np.where(parallel, vars.PARALLEL_MOVEMENT, 0.0)
+
+        return tables
+
+
+class BoundedSearch:
+    """
+    Branch and bound search for the best scoring voicings of one beat. Voices are assigned one at a time, bass first,
+    in the order parts_dont_cross() allows. Each partial voicing is bounded from above by the exact score of what is
+    already fixed, plus the best per-voice score each unassigned voice could still get, plus the most the harmony,
+    parallel motion and duplicate terms could still award whatever the signs of their weights in vars. Subtrees whose
+    bound falls below the best complete voicing found so far are skipped.
+
+    Once the bass and tenor are fixed, every alto completing them is scored at once from the beat's ScoreTables, in
+    the same order as score(), so scores are bit-for-bit equal to the exhaustive paths.
+    """
+
+    # Bounds are added up in a different order than scores, so allow for rounding before pruning
+    TOLERANCE = 1e-9
+
+    MASK_BIT_COUNTS = np.array(pitches.MASK_BIT_COUNTS)
+
+    def __init__(self, beat, candidates):
+        """
+        :param beat: time.Beat being picked for
+        :param candidates: 2d numpy array of candidates as built by get_candidate_matrix()
+        """
+        self.tables = ScoreTables(beat, candidates)
+        self.soprano = int(candidates[0, SOPRANO_POSITION]) if len(candidates) else -1
+        self.expanded = 0
+        self.pruned = 0
+
+        chord = harmony.timeline().chord(time.beat_index(beat.start()))
+        self._chord_mask = chord.mask()
+        self._third = chord.three().midi() % 12 if isinstance(chord, chords.SevenChord) else None
+
+        # per-voice score plus rest penalty of each pitch, indexed like tables.pitches
+        voice_scores = {position: self.tables.unary[position] + (self.tables.pitches[position] == -1) *
+                        vars.REST_PENALTY for position in self.tables.unary}
+        self._voice_scores = {position: scores.tolist() for position, scores in voice_scores.items()}
+        self._best_voice_scores = {position: max(scores) if scores else 0.0
+                                   for position, scores in self._voice_scores.items()}
+        # pitches of each voice, best per-voice score first
+        self._children = {position: self.tables.pitches[position][np.argsort(-scores, kind='mergesort')].tolist()
+                          for position, scores in voice_scores.items()}
+
+        # (best overall, best per first voice slot, best per second voice slot) of each pair's parallel motion score
+        self._pairwise_bounds = {}
+        for pair, table in self.tables.pairwise.items():
+            if table.size:
+                self._pairwise_bounds[pair] = (table.max(), table.max(axis=1).tolist(), table.max(axis=0).tolist())
+            else:
+                self._pairwise_bounds[pair] = (0.0, [0.0] * table.shape[0], [0.0] * table.shape[1])
+
+        # whole voicing terms by chord tone and duplicate count, for scoring altos together
+        self._unique_pitch_scores = [vars.unique_pitch_score(count) for count in range(13)]
+        self._duplicate_scores = [vars.duplicate(count) for count in range(candidates.shape[1])]
+        altos = self.tables.pitches[ALTO_POSITION]
+        self._alto_masks = np.where(altos == -1, 0, np.left_shift(1, altos % 12))
+
+    def best(self):
+        """
+        :return: list of the best scoring voicings as (alto, tenor, bass, soprano) tuples, all of which score equal
+        """
+        best_score = float('-inf')
+        best = []
+
+        for bass in self.__children(BASS_POSITION, lambda pitch: True):
+            if self.__pruned({BASS_POSITION: bass}, best_score):
+                continue
+
+            for tenor in self.__children(TENOR_POSITION, lambda pitch: bass <= pitch or pitch == -1):
+                if self.__pruned({BASS_POSITION: bass, TENOR_POSITION: tenor}, best_score):
+                    continue
+
+                altos, scores = self.alto_scores(bass, tenor)
+                if not len(scores):
+                    continue
+
+                self.expanded += len(scores)
+                top = scores.max()
+                if top >= best_score:
+                    voicings = []
+                    for alto in altos[scores == top].tolist():
+                        voicing = [0] * 4
+                        voicing[ALTO_POSITION], voicing[TENOR_POSITION] = alto, tenor
+                        voicing[BASS_POSITION], voicing[SOPRANO_POSITION] = bass, self.soprano
+                        voicings.append(tuple(voicing))
+
+                    best = voicings if top > best_score else best + voicings
+                    best_score = top
+
+        return best
+
+    def alto_scores(self, bass, tenor):
+        """
+        Scores every alto completing a bass and tenor at once, from the beat's ScoreTables and in the same order as
+        score().
+
+        :return: (numpy array of the altos which don't cross the tenor or soprano, numpy array of their scores)
+        """
+        altos = self.tables.pitches[ALTO_POSITION]
+        keep = ((tenor <= altos) | (altos == -1)) & ((altos <= self.soprano) | (self.soprano == -1))
+        alto_slots = np.flatnonzero(keep)
+        altos = altos[alto_slots]
+
+        fixed = [bass, tenor, self.soprano]
+        slots = {BASS_POSITION: self.tables.slot(BASS_POSITION, bass),
+                 TENOR_POSITION: self.tables.slot(TENOR_POSITION, tenor),
+                 SOPRANO_POSITION: self.tables.slot(SOPRANO_POSITION, self.soprano),
+                 ALTO_POSITION: alto_slots}
+
+        tone_masks = pitches.pitch_class_mask(*[value for value in fixed if value >= 0]) | self._alto_masks[alto_slots]
+        harmony_score = np.take(self._unique_pitch_scores, self.MASK_BIT_COUNTS[tone_masks & self._chord_mask])
+        if self._third is not None:
+            if [value for value in fixed if value % 12 == self._third]:
+                harmony_score = harmony_score + vars.THIRD_PREFERENCE
+            else:
+                harmony_score = harmony_score + np.where(altos % 12 == self._third, vars.THIRD_PREFERENCE, 0.0)
+
+        motion_score = np.zeros(len(altos))
+        for first, second in PARALLEL_PAIRS:
+            motion_score += self.tables.pairwise[(first, second)][slots[first], slots[second]]
+
+        rests = fixed.count(-1) + (altos == -1)
+        duplicates = len(fixed) - len(set(fixed)) + ((altos == bass) | (altos == tenor) | (altos == self.soprano))
+
+        return altos, self.tables.unary[BASS_POSITION][slots[BASS_POSITION]] + \
+            self.tables.unary[TENOR_POSITION][slots[TENOR_POSITION]] + \
+            self.tables.unary[ALTO_POSITION][alto_slots] + harmony_score + motion_score + \
+            rests * vars.REST_PENALTY + np.take(self._duplicate_scores, duplicates)
+
+    def __children(self, position, allowed):
+        """
+        :return: the pitches of a voice which allowed() accepts, best per-voice score first
+        """
+        return [pitch for pitch in self._children[position] if allowed(pitch)]
+
+    def __pruned(self, assigned, best_score):
+        """
+        :param assigned: dict of voice position -> pitch of the voices fixed so far
+        :param best_score: score of the best complete voicing found so far
+        :return: True, counting it as pruned, if no completion of the partial voicing can reach best_score
+        """
+        values = assigned.values() + [self.soprano]
+        slots = {position: self.tables.slot(position, pitch) for position, pitch in assigned.items()}
+        slots[SOPRANO_POSITION] = self.tables.slot(SOPRANO_POSITION, self.soprano)
+        open_voices = [position for position in self._voice_scores if position not in assigned]
+
+        bound = sum(self._voice_scores[position][slots[position]] for position in assigned)
+        bound += sum(self._best_voice_scores[position] for position in open_voices)
+        bound += vars.REST_PENALTY if self.soprano == -1 else 0.0
+
+        # open voices can each add at most one chord tone and one duplicate
+        tone_count = pitches.MASK_BIT_COUNTS[pitches.pitch_class_mask(*[v for v in values if v >= 0]) &
+                                             self._chord_mask]
+        most_tones = min(tone_count + len(open_voices), pitches.MASK_BIT_COUNTS[self._chord_mask])
+        bound += max(self._unique_pitch_scores[tone_count:most_tones + 1])
+
+        if self._third is not None:
+            if [value for value in values if value % 12 == self._third]:
+                bound += vars.THIRD_PREFERENCE
+            elif open_voices:
+                bound += max(0.0, vars.THIRD_PREFERENCE)
+
+        for first, second in PARALLEL_PAIRS:
+            bound += self.__best_pairwise(first, second, slots)
+
+        duplicate_count = len(values) - len(set(values))
+        bound += max(self._duplicate_scores[duplicate_count:duplicate_count + len(open_voices) + 1])
+
+        if bound < best_score - self.TOLERANCE:
+            self.pruned += 1
+            return True
+
+        self.expanded += 1
+        return False
+
+    def __best_pairwise(self, first, second, slots):
+        """
+        :return: the pair's parallel motion score if both voices are fixed in slots, otherwise the most it could be
+        """
+        best, best_by_first, best_by_second = self._pairwise_bounds[(first, second)]
+
+        if first in slots and second in slots:
+            return self.tables.pairwise[(first, second)][slots[first], slots[second]]
+        if first in slots:
+            return best_by_first[slots[first]]
+        if second in slots:
+            return best_by_second[slots[second]]
+
+        return best
+
+
 def get_duplicate_penalty(candidate):
     return vars.duplicate(len(candidate) - len(set(candidate)))
 
 
+def get_duplicate_penalties(candidates):
+    """
+    Batched get_duplicate_penalty() over a candidate matrix
+    """
+    ordered = np.sort(candidates, axis=1)
+    duplicate_counts = (ordered[:, 1:] == ordered[:, :-1]).sum(axis=1)
+
+    return np.array([vars.duplicate(count) for count in range(candidates.shape[1])])[duplicate_counts]
+
+
 def get_rest_penalty(candidate):
     return len([c for c in candidate if c == -1]) * vars.REST_PENALTY
 
 
+def get_rest_penalties(candidates):
+    """
+    Batched get_rest_penalty() over a candidate matrix
+    """
+    return (candidates == -1).sum(axis=1) * vars.REST_PENALTY
+
+
+def voice_scores(score_function, voice_pitches, beat):
+    """
+    Applies a per-voice score function such as get_bass_score() to a column of pitches, calling it once per distinct
+    pitch
+
+    :param score_function: function of (pitch, beat)
+    :param voice_pitches: numpy array of midi values
+    :param beat: time.Beat
+    :return: numpy array of scores, one per pitch
+    """
+    distinct, inverse = np.unique(voice_pitches, return_inverse=True)
+
+    return np.array([score_function(int(pitch), beat) for pitch in distinct])[inverse]
+
+
 def parallel_motion_score(candidate, beat, soprano, alto, tenor, bass):
     last_beat = beat.previous()
     if last_beat is None:
@@ -80,31 +446,28 @@ def parallel_motion_score(candidate, beat, soprano, alto, tenor, bass):
 
 
 def get_bass_score(candidate, beat):
-    low_thresh = parts.BASS.max_low
-    high_thresh = parts.BASS.max_high
+    score = get_bass_beat_score(candidate, beat)
+
+    score += motion_tendency_score(candidate, beat, sequences.bass())
+    score += linear_motion_score(candidate, beat, sequences.bass())
+    score += flicker_avoidance_score(candidate, beat, sequences.bass())
+
+    return score
+
 
-    bottom_encroachment = threshold_encroachment_score(candidate, low_thresh, low_thresh + 4)
-    top_encroachment =  threshold_encroachment_score(candidate, high_thresh, high_thresh - 4)
-    preferred_register = preferred_register_score(candidate, high_thresh, high_thresh - 7)
+def get_bass_beat_score(candidate, beat):
+    """
+    Terms of get_bass_score() which don't depend on the notes picked for earlier beats
+    """
+    register = parts.BASS.register_scores()[candidate]
     bass_note_tendency = bass_note_tendency_score(candidate, beat)
     preemption = preemption_penalty(candidate, beat)
 
-    motion_tendency = motion_tendency_score(candidate, beat, sequences.bass())
-    linear_motion = linear_motion_score(candidate, beat, sequences.bass())
-    flicker_avoidance = flicker_avoidance_score(candidate, beat, sequences.bass())
-
-    return sum((bottom_encroachment, top_encroachment, preferred_register, bass_note_tendency, preemption,
-                motion_tendency, linear_motion, flicker_avoidance))
+    return sum((register, bass_note_tendency, preemption))
 
 
 def get_tenor_score(candidate, beat):
-    score = 0.0
-    low_thresh = parts.TENOR.max_low
-    high_thresh = parts.TENOR.max_high
-
-    score += threshold_encroachment_score(candidate, low_thresh, low_thresh + 4)
-    score += threshold_encroachment_score(candidate, high_thresh, high_thresh - 4)
-    score += preferred_register_score(candidate, low_thresh, low_thresh + 7)
+    score = get_tenor_beat_score(candidate, beat)
 
     score += motion_tendency_score(candidate, beat, sequences.tenor())
     score += linear_motion_score(candidate, beat, sequences.tenor())
@@ -113,14 +476,15 @@ def get_tenor_score(candidate, beat):
     return score
 
 
-def get_alto_score(candidate, beat):
-    score = 0.0
-    low_thresh = parts.ALTO.max_low
-    high_thresh = parts.ALTO.max_high
+def get_tenor_beat_score(candidate, beat):
+    """
+    Terms of get_tenor_score() which don't depend on the notes picked for earlier beats
+    """
+    return parts.TENOR.register_scores()[candidate]
+
 
-    score += threshold_encroachment_score(candidate, low_thresh, low_thresh + 4)
-    score += threshold_encroachment_score(candidate, high_thresh, high_thresh - 4)
-    score += preferred_register_score(candidate, high_thresh, high_thresh - 7)
+def get_alto_score(candidate, beat):
+    score = get_alto_beat_score(candidate, beat)
 
     score += motion_tendency_score(candidate, beat, sequences.alto())
     score += linear_motion_score(candidate, beat, sequences.alto())
@@ -129,12 +493,39 @@ def get_alto_score(candidate, beat):
     return score
 
 
+def get_alto_beat_score(candidate, beat):
+    """
+    Terms of get_alto_score() which don't depend on the notes picked for earlier beats
+    """
+    return parts.ALTO.register_scores()[candidate]
+
+
+def get_beat_scores(candidates, beat):
+    """
+    Batched sum of the terms of score() which don't depend on the notes picked for earlier beats: per-voice
+    register and bass tendency scores, harmony, duplicate and rest penalties
+
+    :param candidates: 2d numpy array of candidates as built by get_candidate_matrix()
+    :param beat: time.Beat being picked for
+    :return: numpy array of scores, one per candidate
+    """
+    bass_score = voice_scores(get_bass_beat_score, candidates[:, BASS_POSITION], beat)
+    tenor_score = voice_scores(get_tenor_beat_score, candidates[:, TENOR_POSITION], beat)
+    alto_score = voice_scores(get_alto_beat_score, candidates[:, ALTO_POSITION], beat)
+
+    return bass_score + tenor_score + alto_score + get_harmony_scores(candidates, beat) + \
+        get_rest_penalties(candidates) + get_duplicate_penalties(candidates)
+
+
 def preemption_penalty(candidate, beat):
-    if beat.end() == config.song_length:
+    context = harmony.timeline()
+    index = time.beat_index(beat.start())
+
+    if context.song_ends()[index]:
         return 0.0
 
-    this_chord = chords.get(beat.start())
-    next_chord = chords.get(beat.next().start())
+    this_chord = context.chord(index)
+    next_chord = context.next_chord(index)
 
     if pitches.same_species(candidate, next_chord.root()) and this_chord != next_chord:
         return vars.PREEMPTION
@@ -166,14 +557,30 @@ def get_harmony_score(candidate, beat):
     return sum((unique_pitches_score, third_preference))
 
 
+def get_harmony_scores(candidates, beat):
+    """
+    Batched get_harmony_score() over a candidate matrix
+    """
+    chord = harmony.timeline().chord(time.beat_index(beat.start()))
+
+    tone_masks = np.where(candidates >= 0, np.left_shift(1, np.mod(candidates, 12)), 0)
+    tone_counts = np.array(pitches.MASK_BIT_COUNTS)[np.bitwise_or.reduce(tone_masks, axis=1) & chord.mask()]
+    unique_pitches_score = np.array([vars.unique_pitch_score(count) for count in range(13)])[tone_counts]
+
+    third_preference = np.zeros(len(candidates))
+    if isinstance(chord, chords.SevenChord):
+        third_preference[(np.mod(candidates, 12) == chord.three().midi() % 12).any(axis=1)] = vars.THIRD_PREFERENCE
+
+    return unique_pitches_score + third_preference
+
+
 def unique_pitch_score(candidate, beat):
-    chord = chords.get(beat.start())
-    unique_pitches = len(set([pitch % 12 for pitch in candidate if pitch in chord.all_octaves()]))
-    return vars.unique_pitch_score(unique_pitches)
+    chord = harmony.timeline().chord(time.beat_index(beat.start()))
+    return vars.unique_pitch_score(chord.chord_tone_count(*candidate))
 
 
 def third_preference_score(candidate, beat):
-    chord = chords.get(beat.start())
+    chord = harmony.timeline().chord(time.beat_index(beat.start()))
     if isinstance(chord, chords.SevenChord):
         if [pitch for pitch in candidate if pitches.same_species(pitch, chord.three())]:
             return vars.THIRD_PREFERENCE
@@ -182,7 +589,9 @@ def third_preference_score(candidate, beat):
 
 
 def bass_note_tendency_score(candidate, beat):
-    this_chord = chords.get(beat.start())
+    context = harmony.timeline()
+    index = time.beat_index(beat.start())
+    this_chord = context.chord(index)
     score = 0.0
 
     candidate_is_this_chord_bass_note = pitches.same_species(candidate, this_chord.bass_note)
@@ -192,10 +601,10 @@ def bass_note_tendency_score(candidate, beat):
         return vars.FIRST_BEAT_BASS_ROOT
 
     # If beat one, we want to hear the bass note
-    if beat.first_beat() and candidate_is_this_chord_bass_note:
+    if context.first_beats()[index] and candidate_is_this_chord_bass_note:
         score += vars.FIRST_BEAT_BASS_NOTE
 
-    last_chord = chords.get(0 if beat.start() == 0 else beat.previous().start())
+    last_chord = context.previous_chord(index)
     this_and_next_chord_are_same = chords.same(last_chord, this_chord)
     this_chord_root_in_bass = this_chord.root_in_bass()
 
@@ -215,18 +624,9 @@ def bass_note_tendency_score(candidate, beat):
     return score
 
 
-def threshold_encroachment_score(val, threshold, soft_limit):
-    if soft_limit < val <= threshold or threshold <= val < soft_limit:
-        return (2 ** abs(soft_limit - val)) * vars.THRESHOLD_ENCROACHMENT
-
-    return 0.0
-
-
-def preferred_register_score(val, threshold, soft_limit):
-    if soft_limit < val <= threshold or threshold <= val < soft_limit:
-        return abs(soft_limit - val) * vars.PREFERRED_REGISTER
-
-    return 0.0
+# Register scores live with the parts they are tabled for, see parts.register_scores()
+threshold_encroachment_score = parts.threshold_encroachment_score
+preferred_register_score = parts.preferred_register_score
 
 
 def motion_tendency_score(candidate, beat, sequence):
@@ -254,6 +654,97 @@ def linear_motion_score(candidate, beat, sequence):
     return score
 
 
+def voice_history(beat, sequence):
+    """
+    Extracts what the motion tendency, linear motion and flicker avoidance scores need to know about the notes a voice
+    played before a beat, so that candidates can be scored with integers alone
+
+    :param beat: time.Beat being picked for
+    :param sequence: the voice's sequence
+    :return: (first, last, two_ago, flicker_run) tuple of ints: 1 if beat starts the song else 0, the midi values of
+             the last two entities before the beat (NO_NOTE for entities which aren't notes), and how many flickers
+             in a row lead up to the last entity, as counted by flicker_avoidance_score()
+    """
+    if beat.start() == 0:
+        return 1, NO_NOTE, NO_NOTE, 0
+
+    last_entity = sequence.entity(beat.start() - 1)
+    two_ago_entity = last_entity.previous_entity()
+
+    flicker_run = 0
+    current_entity = last_entity
+    while current_entity.is_note() and current_entity.start() > 0:
+        previous_entity = current_entity.previous_entity()
+        if not entity_util.is_flicker(current_entity, previous_entity, previous_entity.previous_entity()):
+            break
+
+        flicker_run += 1
+        current_entity = previous_entity
+
+    return 0, __history_pitch(last_entity), __history_pitch(two_ago_entity), flicker_run
+
+
+def __history_pitch(entity):
+    return entity.pitch().midi() if entity.is_note() else NO_NOTE
+
+
+def get_voice_score(candidate, beat_score, history, motion_tendency):
+    """
+    Integer counterpart of get_bass_score(), get_tenor_score() and get_alto_score(), equal to them bit for bit
+
+    :param candidate: midi value
+    :param beat_score: the voice's get_*_beat_score() for the candidate
+    :param history: voice_history() of the voice at the beat
+    :param motion_tendency: the voice's sequence motion tendency
+    :return: score
+    """
+    score = beat_score
+
+    score += history_motion_tendency_score(candidate, history, motion_tendency)
+    score += history_linear_motion_score(candidate, history)
+    score += history_flicker_avoidance_score(candidate, history)
+
+    return score
+
+
+def history_motion_tendency_score(candidate, history, motion_tendency):
+    """
+    motion_tendency_score() from a voice_history()
+    """
+    first, last, two_ago, flicker_run = history
+    if first:
+        return 0.0
+
+    if last != NO_NOTE and last != candidate:
+        return (motion_tendency - 0.5) / vars.MOTION_TENDENCY_DIVISOR
+
+    return (0.5 - motion_tendency) / vars.MOTION_TENDENCY_DIVISOR
+
+
+def history_linear_motion_score(candidate, history):
+    """
+    linear_motion_score() from a voice_history()
+    """
+    first, last, two_ago, flicker_run = history
+
+    if last != NO_NOTE and abs(candidate - last) < 3 and candidate != last:
+        return vars.LINEAR_MOTION
+
+    return 0.0
+
+
+def history_flicker_avoidance_score(candidate, history):
+    """
+    flicker_avoidance_score() from a voice_history()
+    """
+    first, last, two_ago, flicker_run = history
+
+    if not first and last != NO_NOTE and two_ago != NO_NOTE and candidate == two_ago:
+        return (flicker_run + 1) * vars.FLICKER_COEF
+
+    return 0.0
+
+
 def is_motion(pitch1, last_entity):
     return last_entity.is_note() and last_entity.pitch().midi() - pitch1 != 0
 
@@ -270,16 +761,60 @@ def parts_dont_cross(group, soprano_value):
            (group[ALTO_POSITION] <= soprano_value or soprano_value == -1)
 
 
-def get_candidate_matrix(beat, soprano_value):
-    current_chord = chords.get(beat.start())
-
-    alto_candidates = sequences.alto().part().available_notes(current_chord) + [-1]
-    tenor_candidates = sequences.tenor().part().available_notes(current_chord) + [-1]
-    bass_candidates = sequences.bass().part().available_notes(current_chord) + [-1]
-
-    return [g + [soprano_value] for g
-            in combine_pitch_candidates(alto_candidates, tenor_candidates, bass_candidates)
-            if parts_dont_cross(g, soprano_value)]
+def get_candidate_matrix(beat, soprano_value, max_spacing=None, required_mask=0):
+    """
+    Returns every voicing of the chord at beat in which the parts don't cross, as [alto, tenor, bass, soprano]
+    lists. Each part may also rest (-1). Voicings come out in the same order as filtering combine_pitch_candidates()
+    with parts_dont_cross() would produce them, bass varying slowest and alto fastest, so that ties between equal
+    scores are broken the same way. Voicings of the chord, spaced no wider than max_spacing between alto and tenor,
+    are looked up in the voicing cache and only narrowed down here by the constraints which depend on the soprano.
+
+    :param beat: time.Beat whose chord is voiced
+    :param soprano_value: midi value of the soprano, -1 if resting
+    :param max_spacing: if given, the largest interval allowed between the soprano and alto and between the alto
+                        and tenor. Rests are exempt.
+    :param required_mask: pitch class mask (see pitches.pitch_class_mask()) of pitch classes every voicing must
+                          contain, counting the soprano
+    """
+    return get_candidate_array(beat, soprano_value, max_spacing, required_mask).tolist()
+
+
+def get_candidate_array(beat, soprano_value, max_spacing=None, required_mask=0):
+    """
+    get_candidate_matrix() as a 2d numpy array, one row per voicing
+    """
+    current_chord = harmony.timeline().chord(time.beat_index(beat.start()))
+
+    cached = voicing_cache.cache().voicings(current_chord.mask(), sequences.alto().part(), sequences.tenor().part(),
+                                            sequences.bass().part(), max_spacing)
+    # widen the int8 cache entries so that arithmetic on them can't wrap around
+    values = cached.astype(int)
+    alto, tenor, bass = values[:, ALTO_POSITION], values[:, TENOR_POSITION], values[:, BASS_POSITION]
+    keep = ~intervals.crossed(alto, soprano_value)
+
+    if max_spacing is not None and soprano_value != -1:
+        keep &= (alto == -1) | (alto >= soprano_value - max_spacing)
+
+    if required_mask:
+        present = pitches.pitch_class_mask(soprano_value) if soprano_value != -1 else 0
+        for column in (alto, tenor, bass):
+            present = present | np.where(column != -1, 1 << (column % 12), 0)
+        keep &= (present & required_mask) == required_mask
+
+    candidates = np.empty((np.count_nonzero(keep), 4), dtype=int)
+    candidates[:, :SOPRANO_POSITION] = values[keep]
+    candidates[:, SOPRANO_POSITION] = soprano_value
+
+    return candidates
+
+
+def candidate_order(candidate):
+    """
+    :return: sort key putting candidates in the order get_candidate_matrix() returns them: bass varying slowest and
+             alto fastest, each part's notes rising, then its rest
+    """
+    return tuple((candidate[position] == -1, candidate[position])
+                 for position in (BASS_POSITION, TENOR_POSITION, ALTO_POSITION))
 
 
 def combine_pitch_candidates(*args):
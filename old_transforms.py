@@ -2,6 +2,7 @@ from __future__ import division
 
 import chords
 import config
+import intervals
 import pitches
 import sequences
 import vars
@@ -223,7 +224,7 @@ class MajorThirdScalarTransform(EighthNoteTransform):
         this_signature = config.key_signatures[position]
 
         return this_note.type == sequences.Sample.TYPE_START and next_note.type == sequences.Sample.TYPE_START \
-               and abs(this_note.midi() - next_note.midi()) == 4 and intermediate_pitch in this_signature.scale()
+               and abs(this_note.midi() - next_note.midi()) == 4 and this_signature.in_scale(intermediate_pitch)
 
 
 class MinorThirdScalarTransform(EighthNoteTransform):
@@ -237,7 +238,7 @@ class MinorThirdScalarTransform(EighthNoteTransform):
 
         intermediary_notes = this_pitch + 2, this_pitch + 1, this_pitch - 1, this_pitch - 2
         for note in intermediary_notes:
-            if note in this_signature.scale() and min(this_pitch, next_pitch) < note < max(this_pitch, next_pitch):
+            if this_signature.in_scale(note) and min(this_pitch, next_pitch) < note < max(this_pitch, next_pitch):
                 self.intermediate_pitch = note
 
         self.intrinsic_motion = vars.MINOR_THIRD_SCALAR_MOTION
@@ -276,7 +277,7 @@ class MinorThirdScalarTransform(EighthNoteTransform):
                 and abs(this_note.midi() - next_note.midi()) == 3:
 
             for note in intermediary_notes:
-                if note in this_signature.scale():
+                if this_signature.in_scale(note):
                     return True
                 
         return False
@@ -353,7 +354,7 @@ class HalfStepNeighborTransform(EighthNoteTransform):
         this_pitch = sequence[position].midi()
         this_sig = config.key_signatures[position]
 
-        self.intermediate_pitch = this_pitch + 1 if this_pitch + 1 in this_sig.scale() else this_pitch - 1
+        self.intermediate_pitch = this_pitch + 1 if this_sig.in_scale(this_pitch + 1) else this_pitch - 1
         self.intrinsic_musicality = self.__get_musicality()
 
     def __get_musicality(self):
@@ -383,7 +384,7 @@ class HalfStepNeighborTransform(EighthNoteTransform):
 
         return this_note.pitch().midi() == next_note.pitch().midi() \
                and (this_note.type == sequences.Sample.TYPE_START and next_note.type == sequences.Sample.TYPE_START) \
-               and (this_note.pitch.midi() - 1 in this_sig.scale() or this_note.pitch.midi() + 1 in this_sig.scale())
+               and (this_sig.in_scale(this_note.pitch.midi() - 1) or this_sig.in_scale(this_note.pitch.midi() + 1))
 
 
 class WholeStepNeighborTransform(EighthNoteTransform):
@@ -395,7 +396,7 @@ class WholeStepNeighborTransform(EighthNoteTransform):
         this_pitch = sequence[position].midi()
         this_sig = config.key_signatures[position]
 
-        self.intermediate_pitch = this_pitch + 2 if this_pitch + 2 in this_sig.scale() else this_pitch - 2
+        self.intermediate_pitch = this_pitch + 2 if this_sig.in_scale(this_pitch + 2) else this_pitch - 2
         self.intrinsic_musicality = self.__get_musicality()
 
     def __get_musicality(self):
@@ -426,7 +427,7 @@ class WholeStepNeighborTransform(EighthNoteTransform):
 
         return this_note.pitch.midi() == next_note.pitch.midi() \
                and (this_note.type == sequences.Sample.TYPE_START and next_note.type == sequences.Sample.TYPE_START) \
-               and (this_note.midi() - 2 in this_sig.scale() or this_note.midi() + 2 in this_sig.scale())
+               and (this_sig.in_scale(this_note.midi() - 2) or this_sig.in_scale(this_note.midi() + 2))
 
 
 class ApproachTransform(EighthNoteTransform):
@@ -486,7 +487,7 @@ def unique_chord_count(position, beats):
 
 
 def dissonant(pitch1, pitch2):
-    return abs(pitch1 - pitch2) % 12 == 1
+    return bool(intervals.dissonant(pitch1, pitch2))
 
 
 def transforms_cause_parallel_movement(transform1, transform2):
@@ -1,21 +1,89 @@
+import numpy as np
+
 import pitches
+import vars
+
+# Candidates within this many semitones of a part's limits lose score, see threshold_encroachment_score()
+ENCROACHMENT_RANGE = 4
+
+# Candidates within this many semitones of the limit a part avoids lose score, see preferred_register_score()
+PREFERRED_REGISTER_RANGE = 7
+
+__register_tables = {}
 
 
 class Part:
 
-    def __init__(self, max_low, max_high, title):
+    def __init__(self, max_low, max_high, title, avoids_low=False):
+        """
+        :param max_low: lowest midi value of the part's range, exclusive
+        :param max_high: highest midi value of the part's range, exclusive
+        :param title: name of the part
+        :param avoids_low: whether the part prefers to stay away from the bottom of its range rather than the top
+        """
         self.max_low = max_low
         self.max_high = max_high
         self.middle = (max_high + max_low) / 2
         self.title = title
+        self.avoids_low = avoids_low
+
+        self.register_scores()
 
     def available_notes(self, chord):
         return [pitch for pitch in chord.all_octaves() if self.max_low < pitch < self.max_high]
 
+    def register_scores(self):
+        """
+        :return: the part's register_scores() table
+        """
+        return register_scores(self.max_low, self.max_high, self.avoids_low)
+
     def __repr__(self):
         return self.title
 
 
+def register_scores(max_low, max_high, avoids_low=False):
+    """
+    Table of the threshold encroachment and preferred register scores of a range, indexed by midi value. A 129th
+    entry holds the score of -1, so that rests can index the table like any other pitch. Tables are built once per
+    range and weights, and built again if vars.THRESHOLD_ENCROACHMENT or vars.PREFERRED_REGISTER change.
+
+    :param max_low: lowest midi value of the range
+    :param max_high: highest midi value of the range
+    :param avoids_low: whether the preferred register score penalizes the bottom of the range rather than the top
+    :return: numpy array of 129 scores
+    """
+    key = (max_low, max_high, avoids_low, vars.THRESHOLD_ENCROACHMENT, vars.PREFERRED_REGISTER)
+
+    if key not in __register_tables:
+        if avoids_low:
+            avoided, preferred = max_low, max_low + PREFERRED_REGISTER_RANGE
+        else:
+            avoided, preferred = max_high, max_high - PREFERRED_REGISTER_RANGE
+
+        __register_tables[key] = np.array([threshold_encroachment_score(value, max_low, max_low + ENCROACHMENT_RANGE) +
+                                           threshold_encroachment_score(value, max_high,
+                                                                        max_high - ENCROACHMENT_RANGE) +
+                                           preferred_register_score(value, avoided, preferred)
+                                           for value in range(128) + [-1]])
+
+    return __register_tables[key]
+
+
+def threshold_encroachment_score(val, threshold, soft_limit):
+    if soft_limit < val <= threshold or threshold <= val < soft_limit:
+        return (2 ** abs(soft_limit - val)) * vars.THRESHOLD_ENCROACHMENT
+
+    return 0.0
+
+
+def preferred_register_score(val, threshold, soft_limit):
+    if soft_limit < val <= threshold or threshold <= val < soft_limit:
+        return abs(soft_limit - val) * vars.PREFERRED_REGISTER
+
+    return 0.0
+
+
 ALTO = Part(pitches.MIDI_VALUES['F#4'], pitches.MIDI_VALUES['C6'], 'alto')
-TENOR = Part(pitches.MIDI_VALUES['C4'], pitches.MIDI_VALUES['F5'], 'tenor')
+TENOR = Part(pitches.MIDI_VALUES['C4'], pitches.MIDI_VALUES['F5'], 'tenor', avoids_low=True)
 BASS = Part(pitches.MIDI_VALUES['D3'], pitches.MIDI_VALUES['C5'], 'bass')
@@ -1,8 +1,8 @@
 import itertools
 import math
 
-import chords
 import config
+import harmony
 import sequences
 import util
 import vars
@@ -10,10 +10,10 @@ from rhythm import time
 
 
 def detect_and_set_measure_phrasing():
-    signatures_plus_end = time.__signatures.keys() + [config.song_length]
+    signatures_plus_end = time.signatures().keys() + [config.song_length]
     signatures_plus_end.sort()
     for pos1, pos2 in zip(signatures_plus_end, signatures_plus_end[1::]):
-        measures = [time.__measures[key] for key in time.__measures.keys() if pos1 <= key < pos2]
+        measures = list(time.iter_measures(pos1, pos2))
 
         winner = get_most_likely_phrasing(measures)
         time.signature(pos1).set_strong_beat_pattern(winner)
@@ -88,9 +88,7 @@ def __no_chord_before_or_after(beat):
     :param beat: time.Beat object
     :return: True if no other chords nearby
     """
-    return beat.start() in chords.keys() and \
-           beat.start() - beat.length() not in chords.keys() and \
-           beat.end() not in chords.keys()
+    return harmony.timeline().isolated_changes()[time.beat_index(beat.start())]
 
 
 def rhythm_based_strong_beat_score(measure, pattern):
@@ -103,14 +101,22 @@ def rhythm_based_strong_beat_score(measure, pattern):
     """
     likelihood_score = 0.0
     position = 0
-    sequence = sequences.soprano()
+    beat_length = measure.beat_length()
+    boundaries = pattern + (len(measure.beats()), )
+    offsets = [measure.start() + sum(pattern[:i + 1]) * beat_length for i in range(len(pattern))]
+
+    # offsets never decrease, so one pass over the entities sounding between them finds the entity at each
+    entities = sequences.soprano().entities_overlapping(offsets[0], offsets[-1] + 1)
+    entity = next(entities, None)
 
     for i in range(len(pattern)):
-        target_duration = ((pattern + (len(measure.beats()), ))[i + 1] - pattern[i]) * measure.beat_length()
-        entity = sequence.entity(measure.start() + sum([j * measure.beat_length() for j in pattern[:i + 1]]))
+        target_duration = (boundaries[i + 1] - pattern[i]) * beat_length
+
+        while entity is not None and entity.end() <= offsets[i]:
+            entity = next(entities, None)
 
-        if entity.length() == target_duration and entity.start() == position:
-            likelihood_score += vars.RHYTHM_PHRASING_COEF * ((pattern + (len(measure.beats()), ))[i + 1] - pattern[i])
+        if entity is not None and entity.length() == target_duration and entity.start() == position:
+            likelihood_score += vars.RHYTHM_PHRASING_COEF * (boundaries[i + 1] - pattern[i])
 
         position += target_duration
 
@@ -1,4 +1,4 @@
-import itertools
+import bisect
 import re
 
 TEXT_WITH_OCTAVE = re.compile('[A-G]#?[0-9]+')
@@ -88,6 +88,56 @@ OCTAVES = {
 }
 
 
+IONIAN = 'ionian'
+DORIAN = 'dorian'
+PHRYGIAN = 'phrygian'
+LYDIAN = 'lydian'
+MIXOLYDIAN = 'mixolydian'
+AEOLIAN = 'aeolian'
+LOCRIAN = 'locrian'
+HALF_WHOLE = 'half_whole'
+WHOLE_HALF = 'whole_half'
+
+# mode -> intervals above the root
+MODE_INTERVALS = {
+    IONIAN: (0, 2, 4, 5, 7, 9, 11),
+    DORIAN: (0, 2, 3, 5, 7, 9, 10),
+    PHRYGIAN: (0, 1, 3, 5, 7, 8, 10),
+    LYDIAN: (0, 2, 4, 6, 7, 9, 11),
+    MIXOLYDIAN: (0, 2, 4, 5, 7, 9, 10),
+    AEOLIAN: (0, 2, 3, 5, 7, 8, 10),
+    LOCRIAN: (0, 1, 3, 5, 6, 8, 10),
+    HALF_WHOLE: (0, 1, 3, 4, 6, 7, 8, 9, 11),
+    WHOLE_HALF: (0, 2, 3, 5, 6, 8, 9, 11)
+}
+
+# (mode, root pitch class) -> sorted tuple of every midi value in that scale
+SCALES = {(mode, root): tuple(sorted(value for interval in intervals
+                                     for value in range(128)[(root + interval) % 12::12]))
+          for mode, intervals in MODE_INTERVALS.items() for root in range(12)}
+
+# pitch class -> species name, as found in MIDI_VALUES
+SPECIES = (C, C_SHARP, D, D_SHARP, E, F, F_SHARP, G, G_SHARP, A, A_SHARP, B)
+
+# number of set bits in each 12-bit pitch class mask
+MASK_BIT_COUNTS = [bin(mask).count('1') for mask in range(1 << 12)]
+
+
+def pitch_class_mask(*values):
+    """
+    Returns a 12-bit mask with bit (midi value % 12) set for each of the given values
+
+    :param values: midi values or Pitch objects
+    :return: int
+    """
+    mask = 0
+
+    for value in values:
+        mask |= 1 << ((value.midi() if isinstance(value, Pitch) else value) % 12)
+
+    return mask
+
+
 def parallel_movement(part1_first, part1_second, part2_first, part2_second):
     first_difference = part1_first - part2_first
     second_difference = part1_second - part2_second
@@ -97,17 +147,14 @@ def parallel_movement(part1_first, part1_second, part2_first, part2_second):
 
 
 def species(value):
+    if isinstance(value, Pitch):
+        return value.species()
+
     int_value = value
     if isinstance(value, str):
         int_value = midi_value(value)
-    elif isinstance(value, Pitch):
-        int_value = value.midi()
 
-    for key in MIDI_VALUES:
-        remainder = int_value % 12
-
-        if MIDI_VALUES[key] % 12 == remainder:
-            return key[0:len(key) - 2] if '10' in key else key[0:len(key) - 1]
+    return SPECIES[int_value % 12]
 
 
 def same_species(value1, value2):
@@ -130,160 +177,81 @@ def is_perfect_interval(first, second):
     return is_perfect_fifth(first, second) or is_perfect_fourth(first, second) or is_perfect_octave(first, second)
 
 
-def ionian(pitch):
-    pitches = \
-        species(pitch), \
-        species(pitch + 2), \
-        species(pitch + 4), \
-        species(pitch + 5), \
-        species(pitch + 7), \
-        species(pitch + 9), \
-        species(pitch + 11)
+def scale(mode, pitch):
+    """
+    Returns every midi value in the given mode built on pitch's pitch class, from the precomputed SCALES table
 
-    all_pitches = list(itertools.chain.from_iterable([OCTAVES[p] for p in pitches]))
-    all_pitches.sort()
+    :param mode: one of the MODE_INTERVALS keys, e.g. IONIAN
+    :param pitch: midi value of the root, in any octave
+    :return: sorted tuple of midi values
+    """
+    return SCALES[(mode, pitch % 12)]
 
-    return all_pitches
 
+def scale_between(scale_pitches, low, high):
+    """
+    Returns the pitches p of a sorted scale where low <= p <= high, found by bisection
 
-def dorian(pitch):
-    pitches = \
-        species(pitch), \
-        species(pitch + 2), \
-        species(pitch + 3), \
-        species(pitch + 5), \
-        species(pitch + 7), \
-        species(pitch + 9), \
-        species(pitch + 10)
-
-    all_pitches = list(itertools.chain.from_iterable([OCTAVES[p] for p in pitches]))
-    all_pitches.sort()
+    :param scale_pitches: sorted sequence of midi values, e.g. from scale()
+    :param low: midi value or Pitch, inclusive
+    :param high: midi value or Pitch, inclusive
+    :return: tuple of midi values
+    """
+    low = low.midi() if isinstance(low, Pitch) else low
+    high = high.midi() if isinstance(high, Pitch) else high
 
-    return all_pitches
+    return tuple(scale_pitches[bisect.bisect_left(scale_pitches, low):bisect.bisect_right(scale_pitches, high)])
 
 
-def phrygian(pitch):
-    pitches = \
-        species(pitch), \
-        species(pitch + 1), \
-        species(pitch + 3), \
-        species(pitch + 5), \
-        species(pitch + 7), \
-        species(pitch + 8), \
-        species(pitch + 10)
+def ionian(pitch):
+    return scale(IONIAN, pitch)
 
-    all_pitches = list(itertools.chain.from_iterable([OCTAVES[p] for p in pitches]))
-    all_pitches.sort()
 
-    return all_pitches
+def dorian(pitch):
+    return scale(DORIAN, pitch)
 
 
-def lydian(pitch):
-    pitches = \
-        species(pitch), \
-        species(pitch + 2), \
-        species(pitch + 4), \
-        species(pitch + 6), \
-        species(pitch + 7), \
-        species(pitch + 9), \
-        species(pitch + 11)
+def phrygian(pitch):
+    return scale(PHRYGIAN, pitch)
 
-    all_pitches = list(itertools.chain.from_iterable([OCTAVES[p] for p in pitches]))
-    all_pitches.sort()
 
-    return all_pitches
+def lydian(pitch):
+    return scale(LYDIAN, pitch)
 
 
 def mixolydian(pitch):
-    pitches = \
-        species(pitch), \
-        species(pitch + 2), \
-        species(pitch + 4), \
-        species(pitch + 5), \
-        species(pitch + 7), \
-        species(pitch + 9), \
-        species(pitch + 10)
-
-    all_pitches = list(itertools.chain.from_iterable([OCTAVES[p] for p in pitches]))
-    all_pitches.sort()
-
-    return all_pitches
+    return scale(MIXOLYDIAN, pitch)
 
 
 def aeolian(pitch):
-    pitches = \
-        species(pitch), \
-        species(pitch + 2), \
-        species(pitch + 3), \
-        species(pitch + 5), \
-        species(pitch + 7), \
-        species(pitch + 8), \
-        species(pitch + 10)
-
-    all_pitches = list(itertools.chain.from_iterable([OCTAVES[p] for p in pitches]))
-    all_pitches.sort()
-
-    return all_pitches
+    return scale(AEOLIAN, pitch)
 
 
 def locrian(pitch):
-    pitches = \
-        species(pitch), \
-        species(pitch + 1), \
-        species(pitch + 3), \
-        species(pitch + 5), \
-        species(pitch + 6), \
-        species(pitch + 8), \
-        species(pitch + 10)
-
-    all_pitches = list(itertools.chain.from_iterable([OCTAVES[p] for p in pitches]))
-    all_pitches.sort()
-
-    return all_pitches
+    return scale(LOCRIAN, pitch)
 
 
 def half_whole(pitch):
-    pitches = \
-        species(pitch), \
-        species(pitch + 1), \
-        species(pitch + 3), \
-        species(pitch + 4), \
-        species(pitch + 6), \
-        species(pitch + 7), \
-        species(pitch + 8), \
-        species(pitch + 9), \
-        species(pitch + 11)
-
-    all_pitches = list(itertools.chain.from_iterable([OCTAVES[p] for p in pitches]))
-    all_pitches.sort()
-
-    return all_pitches
+    return scale(HALF_WHOLE, pitch)
 
 
 def whole_half(pitch):
-    pitches = \
-        species(pitch), \
-        species(pitch + 2), \
-        species(pitch + 3), \
-        species(pitch + 5), \
-        species(pitch + 6), \
-        species(pitch + 8), \
-        species(pitch + 9), \
-        species(pitch + 11)
+    return scale(WHOLE_HALF, pitch)
 
-    all_pitches = list(itertools.chain.from_iterable([OCTAVES[p] for p in pitches]))
-    all_pitches.sort()
 
-    return all_pitches
+def midi_value(string):
+    value = NAME_MIDI_VALUES.get(string, None)
 
+    return __parse_midi_value(string) if value is None else value
 
-def midi_value(string):
+
+def __parse_midi_value(string):
     if TEXT_WITH_OCTAVE.match(string):
         value_with_octave = string
     elif TEXT_WITHOUT_OCTAVE.match(string):
         value_with_octave = string + '0'
     else:
-        raise ValueError('Invalid string value ' + value + ' submitted')
+        raise ValueError('Invalid string value ' + string + ' submitted')
 
     pitch_without_octave = ''.join(c for c in value_with_octave if not c.isdigit())
     octave = int(''.join(c for c in value_with_octave if c.isdigit()))
@@ -294,11 +262,12 @@ def midi_value(string):
 def parse(value):
     if isinstance(value, int):
         if 0 <= value <= 127:
-            return Pitch(value)
+            return PITCHES[value]
         else:
             raise ValueError('value ' + str(value) + ' is out of midi range')
     elif isinstance(value, str):
-        return Pitch(midi_value(value))
+        int_value = midi_value(value)
+        return PITCHES[int_value] if 0 <= int_value <= 127 else Pitch(int_value)
     elif isinstance(value, Pitch):
         return value
     else:
@@ -365,3 +334,11 @@ class Pitch:
             return self.midi() <= other
 
         return False
+
+
+# pitch name, with or without octave -> midi value, for every name midi_value() is commonly asked for
+NAME_MIDI_VALUES = {name + octave: __parse_midi_value(name + octave)
+                    for name in PITCH_COEFS.keys() for octave in [''] + [str(i) for i in range(11)]}
+
+# midi value -> shared Pitch object returned by parse(). Pitch objects are never modified, so they can be shared
+PITCHES = tuple(Pitch(value) for value in range(128))
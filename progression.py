@@ -0,0 +1,241 @@
+"""
+Picks the initial accompaniment for every strong beat of the song at once, rather than one beat at a time like
+note_picker.NotePicker.compute().
+
+Every term of NotePicker.score() but one either depends on the beat alone (see note_picker.get_beat_scores()) or on
+the voicing picked for the previous strong beat: motion tendency, linear motion and parallel motion. ProgressionPicker
+runs the Viterbi algorithm over those: states are the candidate voicings of each strong beat and transitions between
+consecutive beats are scored as whole matrices with NumPy. Cost grows linearly with the number of strong beats.
+
+Flicker avoidance is the exception. It looks back to the pitch two strong beats earlier and to how many flickers led
+up to it, which a voicing alone doesn't determine. ProgressionPicker carries that history along each state's best
+predecessor only, so it can discard a path which flicker avoidance would have favoured later on. Its arrangement is
+then not necessarily the highest scoring one; it is only guaranteed to be while vars.FLICKER_COEF is 0.
+
+BeamPicker keeps the best few partial arrangements from beat to beat instead, each with its full history, and so
+scores every arrangement it keeps exactly.
+"""
+
+import numpy as np
+
+import config
+import harmony
+import intervals
+import note_picker
+import sequences
+import vars
+from note_picker import ALTO_POSITION, TENOR_POSITION, BASS_POSITION, SOPRANO_POSITION
+from rhythm import time
+
+# (candidate column, sequence function) of each accompaniment voice
+VOICES = ((ALTO_POSITION, sequences.alto), (TENOR_POSITION, sequences.tenor), (BASS_POSITION, sequences.bass))
+
+# stands in for the pitch two beats back where there is none, so that nothing counts as a flicker
+NO_PITCH = -2
+
+
+class ProgressionPicker:
+    def __init__(self):
+        self.score = None
+
+    def compute(self):
+        """
+        Picks the voicings for all strong beats with the Viterbi algorithm, see the module docstring for when they are
+        the highest scoring ones. Sets self.score to their total.
+
+        :return: list of candidates as built by note_picker.get_candidate_matrix(), one per strong beat in order
+        """
+        steps = [Step(beat) for beat in time.iter_strong_beats()]
+        if not steps:
+            self.score = 0.0
+            return []
+
+        totals = steps[0].beat_scores
+        history = History(len(steps[0].candidates))
+        parents = []
+
+        for previous, step in zip(steps, steps[1:]):
+            scores = totals[:, np.newaxis] + step.transition_scores(previous.candidates, history)
+            best = scores.argmax(axis=0)
+
+            totals = scores[best, np.arange(len(best))] + step.beat_scores
+            history = history.rows(best).advance(previous.candidates[best], step.candidates)
+            parents.append(best)
+
+        index = int(totals.argmax())
+        self.score = float(totals[index])
+
+        path = [index]
+        for best in reversed(parents):
+            path.append(int(best[path[-1]]))
+        path.reverse()
+
+        return [step.candidates[i].tolist() for step, i in zip(steps, path)]
+
+
+class BeamPicker:
+    def __init__(self, width=None):
+        """
+        :param width: number of partial arrangements kept from one strong beat to the next. Defaults to
+                      config.beam_width. A width of 1 picks like NotePicker.compute(), up to ties between equal scores.
+        """
+        self.width = config.beam_width if width is None else width
+        self.score = None
+
+    def compute(self):
+        """
+        Extends each kept partial arrangement with every candidate of the next strong beat, then keeps the width best
+        of those. Partial arrangements are stored as a pointer from each kept voicing to the one it follows rather than
+        as copies of the voicings picked so far. Sets self.score to the total of the returned arrangement.
+
+        :return: list of candidates as built by note_picker.get_candidate_matrix(), one per strong beat in order
+        """
+        steps = [Step(beat) for beat in time.iter_strong_beats()]
+        if not steps:
+            self.score = 0.0
+            return []
+
+        # kept[i] holds the candidate index of each kept partial arrangement's voicing for step i, parents[i] the
+        # index within kept[i - 1] of the arrangement it extends
+        kept = [self.__best(steps[0].beat_scores)]
+        parents = [None]
+        totals = steps[0].beat_scores[kept[0]]
+        history = History(len(kept[0]))
+
+        for previous, step in zip(steps, steps[1:]):
+            last_candidates = previous.candidates[kept[-1]]
+            scores = totals[:, np.newaxis] + step.transition_scores(last_candidates, history) + step.beat_scores
+
+            best = self.__best(scores.ravel())
+            rows, columns = np.unravel_index(best, scores.shape)
+
+            kept.append(columns)
+            parents.append(rows)
+            totals = scores.ravel()[best]
+            history = history.rows(rows).advance(last_candidates[rows], step.candidates[columns])
+
+        index = int(totals.argmax())
+        self.score = float(totals[index])
+
+        path = []
+        for i in reversed(range(len(steps))):
+            path.append(steps[i].candidates[kept[i][index]].tolist())
+            index = parents[i][index] if i else None
+        path.reverse()
+
+        return path
+
+    def __best(self, scores):
+        """
+        :return: indices of the self.width highest scores, highest first, earlier indices first among equal scores
+        """
+        return np.argsort(-scores, kind='mergesort')[:self.width]
+
+
+class Step:
+    """
+    A strong beat along with its candidate voicings and their beat scores
+    """
+
+    def __init__(self, beat):
+        self.beat = beat
+        self.soprano = soprano_value(beat)
+        self.candidates = note_picker.get_candidate_array(beat, self.soprano)
+        self.beat_scores = note_picker.get_beat_scores(self.candidates, beat)
+
+    def transition_scores(self, last_candidates, history):
+        """
+        Scores moving from voicings of the previous strong beat to each candidate of this one, i.e. the motion
+        tendency, linear motion, flicker avoidance and parallel motion terms of NotePicker.score()
+
+        :param last_candidates: 2d numpy array of voicings picked for the previous strong beat
+        :param history: History of last_candidates
+        :return: 2d numpy array, one row per voicing of last_candidates and one column per candidate
+        """
+        last = last_candidates[:, np.newaxis, :]
+        this = self.candidates[np.newaxis, :, :]
+        scores = np.zeros((len(last_candidates), len(self.candidates)))
+
+        for position, sequence in VOICES:
+            moved = last[:, :, position] != this[:, :, position]
+            tendency = sequence().motion_tendency()
+
+            scores += np.where(moved, tendency - 0.5, 0.5 - tendency) / vars.MOTION_TENDENCY_DIVISOR
+            scores += (moved & (np.abs(this[:, :, position] - last[:, :, position]) < 3)) * vars.LINEAR_MOTION
+            scores += history.flicker_counts(position, self.candidates[:, position]) * vars.FLICKER_COEF
+
+        last_beat = self.beat.previous()
+        if last_beat is not None:
+            last = np.array(last[:, 0, :])
+            last[:, SOPRANO_POSITION] = soprano_value(last_beat)
+
+            for first, second in note_picker.PARALLEL_PAIRS:
+                scores += intervals.parallel_perfect(last[:, first, np.newaxis], this[:, :, first],
+                                                     last[:, second, np.newaxis], this[:, :, second]) * \
+                    vars.PARALLEL_MOVEMENT
+
+        return scores
+
+
+class History:
+    """
+    What flicker avoidance needs to know about each of a number of partial arrangements ending on the same strong
+    beat: per voice, the pitch played two strong beats earlier and the number of consecutive flickers leading up to
+    the last voicing.
+    """
+
+    def __init__(self, arrangement_count, two_ago=None, runs=None):
+        shape = (arrangement_count, 4)
+        self.two_ago = np.full(shape, NO_PITCH) if two_ago is None else two_ago
+        self.runs = np.zeros(shape, dtype=int) if runs is None else runs
+
+    def flicker_counts(self, position, pitches):
+        """
+        :param position: voice column, e.g. note_picker.BASS_POSITION
+        :param pitches: numpy array of midi values the voice could move to
+        :return: 2d numpy array of flicker counts, one row per arrangement and one column per pitch
+        """
+        flickers = self.two_ago[:, position, np.newaxis] == pitches[np.newaxis, :]
+
+        return flickers * (self.runs[:, position, np.newaxis] + 1)
+
+    def rows(self, indices):
+        """
+        :param indices: numpy array of arrangement indices, possibly repeated
+        :return: History of just those arrangements, in the given order
+        """
+        return History(len(indices), self.two_ago[indices], self.runs[indices])
+
+    def advance(self, last_candidates, candidates):
+        """
+        Extends every arrangement by one strong beat
+
+        :param last_candidates: 2d numpy array of the last voicing of each arrangement
+        :param candidates: 2d numpy array of the voicing each arrangement is extended with
+        :return: History of the extended arrangements
+        """
+        runs = np.where(self.two_ago == candidates, self.runs + 1, 0)
+
+        return History(len(candidates), last_candidates, runs)
+
+
+def soprano_value(beat):
+    """
+    :return: midi value of the soprano at beat, -1 if resting
+    """
+    return int(harmony.timeline().soprano()[time.beat_index(beat.start())])
+
+
+def write_arrangement(candidates):
+    """
+    Writes one voicing per strong beat into the alto, tenor and bass sequences, each voice's whole path at once with
+    AccompanimentSequence.add_run()
+
+    :param candidates: list of candidates as returned by ProgressionPicker.compute(), one per strong beat in order
+    """
+    beats = list(time.iter_strong_beats())
+    ends = [beat.start() for beat in beats[1:]] + [config.song_length]
+
+    for position, sequence in VOICES:
+        sequence().add_run([sequences.Note(sequence(), beat.start(), end, candidate[position])
+                            for beat, end, candidate in zip(beats, ends, candidates)])
@@ -1,47 +1,110 @@
 from __future__ import division
 
+import bisect
+import collections
 import math
 
 import config
 
 __signatures = {}
-__beats = {}
+__signature_positions = []
+
+# The grid is described arithmetically by signature spans (see _Span); Measure and Beat objects are only created
+# when asked for, and are kept here by start position once they have been.
+__spans = []
+__span_starts = []
+__span_first_measures = []
+__span_first_beats = []
 __measures = {}
 
 
 def measure(index):
-    keys = __measures.keys()
-    keys.sort()
-    return __measures[keys[index]]
+    span = __spans[__span_index(__span_first_measures, __normalize(index, measure_count()))]
+    return __measure(span, index % measure_count() - span.first_measure)
 
 
 def beat_at_index(index):
-    keys = __beats.keys()
-    keys.sort()
-    return __beats[keys[index]]
+    span = __spans[__span_index(__span_first_beats, __normalize(index, beat_count()))]
+    return __beat(span, index % beat_count() - span.first_beat)
 
 
 def beat_at_position(position):
-    beat_or_none = __beats.get(position, None)
+    index = beat_index(position)
 
-    if beat_or_none is None:
-        keys = __beats.keys()
-        keys.sort()
-        keys = reversed(keys)
+    if index is None:
+        return None
 
-        for key in keys:
-            if position > key:
-                return __beats[key]
+    return beat_at_index(index)
 
-    return beat_or_none
+
+def beat_index(position):
+    """
+    Returns the index of the beat sounding at the given position, i.e. the last beat starting at or before it
+
+    :param position: sample position
+    :return: index into the song's beats, or None if the position comes before the first beat
+    """
+    span_index = bisect.bisect_right(__span_starts, position) - 1
+
+    if span_index < 0:
+        return None
+
+    span = __spans[span_index]
+    return span.first_beat + min((position - span.start) // span.beat_length, span.beat_count - 1)
+
+
+def measure_count():
+    return __span_first_measures[-1] + __spans[-1].measure_count if __spans else 0
+
+
+def beat_count():
+    return __span_first_beats[-1] + __spans[-1].beat_count if __spans else 0
+
+
+def measure_at_position(position):
+    span_index = bisect.bisect_right(__span_starts, position) - 1
+
+    if span_index < 0:
+        return None
+
+    span = __spans[span_index]
+    return __measure(span, min((position - span.start) // span.measure_length, span.measure_count - 1))
 
 
 def measures():
-    return __measures
+    return MeasureView(__spans)
 
 
 def beats():
-    return __beats
+    return BeatView(__spans)
+
+
+def iter_measures(start=None, end=None):
+    """
+    Yields Measures in order, creating each one only as it is reached
+
+    :param start: if given, skip measures starting before this sample position
+    :param end: if given, stop at the first measure starting at or after this sample position
+    """
+    for span in __spans:
+        for i in range(span.measure_count):
+            position = span.measure_start(i)
+
+            if start is not None and position < start:
+                continue
+            if end is not None and position >= end:
+                return
+
+            yield __measure(span, i)
+
+
+def iter_strong_beats():
+    """
+    Yields the strong beats of every measure in order, creating measures only as they are reached
+    """
+    for m in iter_measures():
+        for beat in m.strong_beats():
+            yield beat
 
 
 def signatures():
@@ -49,50 +112,142 @@ def signatures():
 
 
 def signature(position):
-    time_signatures_or_none = __signatures.get(position, None)
-
-    if time_signatures_or_none is None:
-        keys = __signatures.keys()
-        keys.sort()
-        keys = reversed(keys)
+    index = bisect.bisect_right(__signature_positions, position) - 1
 
-        for key in keys:
-            if position > key:
-                return __signatures[key]
+    if index < 0:
+        return None
 
-    return time_signatures_or_none
+    return __signatures[__signature_positions[index]]
 
 
 def clear():
-    global __signatures
+    global __signatures, __signature_positions
     __signatures = {}
+    __signature_positions = []
+
+
+def set_signatures(signatures):
+    """
+    Replaces all time signatures at once and lays out the grid a single time. Prefer this to repeated
+    add_signature calls when loading a file.
+
+    :param signatures: map of sample position -> TimeSignature
+    """
+    global __signatures, __signature_positions, __measures
+    __signatures = dict(signatures)
+    __signature_positions = sorted(__signatures.keys())
+    __measures = {}
+    __compute_time_increments()
 
 
 def add_signature(sample_position, signature):
+    if sample_position not in __signatures:
+        bisect.insort(__signature_positions, sample_position)
+
     __signatures[sample_position] = signature
-    __compute_time_increments()
+    __recompute_around(sample_position)
 
 
 def delete_signature(sample_position):
     del __signatures[sample_position]
-    __compute_time_increments()
+    del __signature_positions[bisect.bisect_left(__signature_positions, sample_position)]
+    __recompute_around(sample_position)
 
 
-def __compute_time_increments():
-    global __measures, __beats
-    __measures = {}
-    __beats = {}
+def __span_boundaries():
+    """
+    Returns the sorted positions at which signature spans begin and end, i.e. signature positions plus song end
+    """
+    boundaries = __signature_positions + [config.song_length]
+    boundaries.sort()
+    return boundaries
+
+
+def __compute_time_increments(start=None):
+    """
+    Lays out the signature spans. Only a handful of integers per signature change; no Measures or Beats are created.
+
+    :param start: if given, spans ending at or before this sample position are kept as they are and only the spans
+                  after them are laid out again
+    """
+    global __spans, __span_starts, __span_first_measures, __span_first_beats
+
+    # the last span before start is laid out again too, since it counts its overhanging beats only if it is last
+    kept = [] if start is None else [span for span in __spans if span.end <= start][:-1]
+
+    boundaries = __span_boundaries()
+    if kept:
+        boundaries = boundaries[bisect.bisect_left(boundaries, kept[-1].end):]
+
+    spans = [_Span(pos1, pos2, signature(pos1)) for pos1, pos2 in zip(boundaries, boundaries[1:])
+             if pos1 < pos2 and signature(pos1) is not None]
+
+    first_measure = kept[-1].first_measure + kept[-1].measure_count if kept else 0
+    first_beat = kept[-1].first_beat + kept[-1].beat_count if kept else 0
+    for i, span in enumerate(spans):
+        span.lay_out(first_measure, first_beat, i == len(spans) - 1)
+        first_measure += span.measure_count
+        first_beat += span.beat_count
+
+    spans = kept + spans
+    __spans = spans
+    __span_starts = [span.start for span in spans]
+    __span_first_measures = [span.first_measure for span in spans]
+    __span_first_beats = [span.first_beat for span in spans]
+
+
+def __recompute_around(sample_position):
+    """
+    Forgets Measures from the span boundary before a signature that was just added, replaced or deleted at
+    sample_position up to the next signature change, and re-lays out the spans from that boundary onward. Measures
+    outside of that range and the spans before it are kept.
+
+    :param sample_position: position of the edited signature
+    """
+    boundaries = __span_boundaries()
+    before = bisect.bisect_left(boundaries, sample_position) - 1
+    after = bisect.bisect_right(__signature_positions, sample_position)
 
-    signature_positions_plus_end = __signatures.keys() + [config.song_length]
-    signature_positions_plus_end.sort()
+    start = boundaries[before] if before >= 0 else sample_position
+    # spans running past the song end keep the last signature, so without a later change everything after is affected
+    end = __signature_positions[after] if after < len(__signature_positions) else None
 
-    for pos1, pos2 in zip(signature_positions_plus_end, signature_positions_plus_end[1::]):
-        sig1 = signature(pos1)
+    first_span = max(bisect.bisect_right(__span_starts, start) - 1, 0)
+    last_span = len(__spans) if end is None else bisect.bisect_left(__span_starts, end)
 
-        measure_group = {position: Measure(position) for position in range(pos1, pos2)[::sig1.samples_per_measure()]}
-        __measures.update(measure_group)
-        beat_group = [beat for k in measure_group.keys() for beat in measure_group[k].beats()]
-        __beats.update({beat.start(): beat for beat in beat_group})
+    for span in __spans[first_span:last_span]:
+        for i in range(span.measure_count):
+            if start <= span.measure_start(i) and (end is None or span.measure_start(i) < end):
+                __measures.pop(span.measure_start(i), None)
+
+    __compute_time_increments(start)
+
+
+def __measure(span, index_in_span):
+    position = span.measure_start(index_in_span)
+    m = __measures.get(position, None)
+
+    if m is None:
+        m = Measure(position, span.time_signature)
+        __measures[position] = m
+
+    return m
+
+
+def __beat(span, index_in_span):
+    numerator = span.time_signature.numerator
+    return __measure(span, index_in_span // numerator).beat(index_in_span % numerator)
+
+
+def __span_index(firsts, index):
+    return bisect.bisect_right(firsts, index) - 1
+
+
+def __normalize(index, count):
+    if not -count <= index < count:
+        raise IndexError('index %d out of range' % index)
+
+    return index % count
 
 
 # TODO: this has to go
@@ -136,11 +291,94 @@ class TimeSignature:
         return self._strong_beat_pattern
 
 
+class _Span:
+    """
+    Stretch of the song from one time signature change up to the next. Measures repeat every samples_per_measure
+    from the start; the last one may run past the end of the span. Where it does, its overhanging beats only count
+    as song beats in the final span, otherwise the next span's beats take their place.
+    """
+
+    def __init__(self, start, end, time_signature):
+        self.start = start
+        self.end = end
+        self.time_signature = time_signature
+        self.measure_length = time_signature.samples_per_measure()
+        self.beat_length = int(4 / time_signature.denominator * config.resolution)
+        self.measure_count = -(-(end - start) // self.measure_length)
+        self.first_measure = 0
+        self.first_beat = 0
+        self.beat_count = 0
+
+    def lay_out(self, first_measure, first_beat, last):
+        self.first_measure = first_measure
+        self.first_beat = first_beat
+        self.beat_count = self.measure_count * self.time_signature.numerator if last \
+            else -(-(self.end - self.start) // self.beat_length)
+
+    def measure_start(self, index):
+        return self.start + index * self.measure_length
+
+    def beat_start(self, index):
+        return self.start + index * self.beat_length
+
+
+class MeasureView(collections.Mapping):
+    """
+    Read-only map of start position -> Measure over the given spans. Positions are computed from the spans and
+    Measures are only created when looked up.
+    """
+
+    def __init__(self, spans):
+        self._spans = spans
+
+    def __getitem__(self, key):
+        m = measure_at_position(key)
+
+        if m is None or m.start() != key:
+            raise KeyError(key)
+
+        return m
+
+    def __iter__(self):
+        for span in self._spans:
+            for i in range(span.measure_count):
+                yield span.measure_start(i)
+
+    def __len__(self):
+        return sum(span.measure_count for span in self._spans)
+
+
+class BeatView(collections.Mapping):
+    """
+    Read-only map of start position -> Beat over the given spans. Positions are computed from the spans and
+    Beats are only created when looked up.
+    """
+
+    def __init__(self, spans):
+        self._spans = spans
+
+    def __getitem__(self, key):
+        b = beat_at_position(key)
+
+        if b is None or b.start() != key:
+            raise KeyError(key)
+
+        return b
+
+    def __iter__(self):
+        for span in self._spans:
+            for i in range(span.beat_count):
+                yield span.beat_start(i)
+
+    def __len__(self):
+        return sum(span.beat_count for span in self._spans)
+
+
 class Measure:
 
-    def __init__(self, start):
+    def __init__(self, start, time_signature=None):
         self._start = start
-        self._time_signature = signature(start)
+        self._time_signature = signature(start) if time_signature is None else time_signature
         self._samples_per_beat = int(4 / self.time_signature().denominator * config.resolution)
         self._beats = self._compute_beats()
 
@@ -185,7 +423,7 @@ class Beat:
 
     def __init__(self, position, index_in_measure, parent):
         self._start = position
-        self._time_signature = signature(position)
+        self._time_signature = parent.time_signature()
         self._end = position + parent.beat_length()
         self._index_in_measure = index_in_measure
         self._parent = parent
@@ -218,22 +456,20 @@ class Beat:
         return self.index_in_measure() == self.time_signature().numerator - 1
 
     def previous(self):
-        if self.start() == 0:
-            return None
+        index = beat_index(self.start())
 
-        keys = beats().keys()
-        keys.sort()
+        if index is None or index == 0:
+            return None
 
-        return beats()[keys[keys.index(self.start()) - 1]]
+        return beat_at_index(index - 1)
 
     def next(self):
-        if self.start() == config.song_length - self.length():
-            return None
+        index = beat_index(self.start())
 
-        keys = beats().keys()
-        keys.sort()
+        if index is None or index == beat_count() - 1:
+            return None
 
-        return beats()[keys[keys.index(self.start()) + 1]]
+        return beat_at_index(index + 1)
 
     def on_beat(self):
         numerator = self.time_signature().numerator
@@ -1,6 +1,11 @@
 from __future__ import division
 
+import array
+import bisect
+import collections
 import copy
+import heapq
+import sys
 
 import midi
 
@@ -11,22 +16,25 @@ import pat_util
 from pitches import Pitch
 from rhythm import time
 
+# midi value stored for rests by array-backed storage
+REST_PITCH = -1
+
 __soprano = None
 __alto = None
 __tenor = None
 __bass = None
 
 
-def init(track, alto_config={}, tenor_config={}, bass_config={'motion_tendency': 0.4}):
+def init(track, alto_config={}, tenor_config={}, bass_config={'motion_tendency': 0.4}, compact=False):
     global __soprano
     global __alto
     global __tenor
     global __bass
 
-    __soprano = RootSequence(track)
-    __alto = AccompanimentSequence(config.song_length, parts.ALTO, alto_config)
-    __tenor = AccompanimentSequence(config.song_length, parts.TENOR, tenor_config)
-    __bass = AccompanimentSequence(config.song_length, parts.BASS, bass_config)
+    __soprano = RootSequence(track, compact)
+    __alto = AccompanimentSequence(config.song_length, parts.ALTO, alto_config, compact)
+    __tenor = AccompanimentSequence(config.song_length, parts.TENOR, tenor_config, compact)
+    __bass = AccompanimentSequence(config.song_length, parts.BASS, bass_config, compact)
 
 
 def soprano():
@@ -47,8 +55,8 @@ def bass():
 
 class Sequence:
 
-    def __init__(self):
-        self._entities = {}
+    def __init__(self, compact=False):
+        self._entities = CompactEntityMap(self) if compact else EntityMap()
 
     def pitch(self, position):
         """
@@ -63,6 +71,19 @@ class Sequence:
     def entities(self):
         return self._entities
 
+    def snapshot(self):
+        """
+        Returns a copy-on-write version of this sequence for trial edits. Edits made to the snapshot are recorded
+        on top of this sequence's entities without copying them, so a snapshot costs O(1) to create and each edit
+        only as much as it touches. This sequence must not be edited while snapshots of it are in use.
+
+        :return: Sequence of the same class as this one
+        """
+        snapshot = copy.copy(self)
+        snapshot._entities = OverlayEntityMap(snapshot, self._entities)
+
+        return snapshot
+
     def add_entities(self, *args):
         """
         Wrapper around add_entity to add multiple
@@ -82,25 +103,29 @@ class Sequence:
         current_entity_at_start = self.entity(new_entity.start())
         current_entity_at_end = self.entity(new_entity.end())
 
+        # Adjusted entities are written back rather than relied upon as shared references, so that storage
+        # which materializes entities on demand (see CompactEntityMap) stays in sync.
         if current_entity_at_start == current_entity_at_end:
             new_end_entity = copy.copy(current_entity_at_start)
-            current_entity_at_start._end = new_entity.start()
             new_end_entity._start = new_entity.end()
             self._entities[new_end_entity.start()] = new_end_entity
-        else:
-            current_entity_at_start._end = new_entity.start()
-            self._entities[new_entity.end()] = current_entity_at_end
+        elif isinstance(current_entity_at_end, TimedEntity):
             current_entity_at_end._start = new_entity.end()
 
-            if isinstance(current_entity_at_end, TimedEntity) and current_entity_at_end.length() == 0:
-                del self._entities[current_entity_at_end.start()]
+            if current_entity_at_end.length() > 0:
+                self._entities[current_entity_at_end.start()] = current_entity_at_end
+
+        current_entity_at_start._end = new_entity.start()
 
         if current_entity_at_start.length() == 0:
             del self._entities[current_entity_at_start.start()]
+        else:
+            self._entities[current_entity_at_start.start()] = current_entity_at_start
 
         self._entities[new_entity.start()] = new_entity
 
-        keys_to_remove = [key for key in self._entities.keys() if new_entity.start() < key < new_entity.end()]
+        keys_to_remove = [key for key in self._entities.keys_between(new_entity.start(), new_entity.end())
+                          if key != new_entity.start()]
         for key in keys_to_remove:
             del self._entities[key]
 
@@ -115,18 +140,37 @@ class Sequence:
         elif position >= config.song_length:
             return TrackEnd(self)
 
-        entity_or_none = self._entities.get(position, None)
+        return self._entities.floor(position)
 
-        if entity_or_none is None:
-            keys = self._entities.keys()
-            keys.sort()
-            keys = reversed(keys)
+    def entities_between(self, start, end):
+        """
+        Yields, in position order, the entities which start within [start, end). Cost is bounded by the number of
+        entities yielded rather than the length of the sequence.
+
+        :param start: sample position, inclusive
+        :param end: sample position, exclusive
+        :return: generator of Entity objects
+        """
+        return self._entities.values_between(start, end)
+
+    def entities_overlapping(self, start, end):
+        """
+        Yields, in position order, the entities which sound for any part of [start, end), including an entity
+        which started before start but is still sounding at it.
+
+        :param start: sample position, inclusive
+        :param end: sample position, exclusive
+        :return: generator of Entity objects
+        """
+        if start >= end:
+            return
 
-            for key in keys:
-                if position > key:
-                    return self._entities[key]
+        first = self._entities.floor(start)
+        if first is not None and first.start() < start < first.end():
+            yield first
 
-        return entity_or_none
+        for entity in self.entities_between(max(start, 0), end):
+            yield entity
 
     def is_rest(self, position):
         return self.entity(position).is_rest()
@@ -134,15 +178,35 @@ class Sequence:
     def apply_transform(self, transform):
         pass
 
-    def note_duration_count(self):
-        notes = [entity for entity in self._entities.values() if isinstance(entity, Note)]
+    def note_duration_count(self, start=0, end=None):
+        """
+        Counts notes by duration
+
+        :param start: only count notes starting at or after this sample position
+        :param end: only count notes starting before this sample position, defaults to the end of the song
+        :return: dict of duration -> number of notes
+        """
+        if isinstance(self._entities, CompactEntityMap):
+            # columns are the storage itself, so slicing them avoids materializing entities
+            starts, ends, midi_values = self._entities.columns()
+            first = bisect.bisect_left(starts, start)
+            last = len(starts) if end is None else bisect.bisect_left(starts, end)
+            notes = zip(starts[first:last], ends[first:last], midi_values[first:last])
+        else:
+            entities = self.entities_between(start, sys.maxint if end is None else end)
+            notes = ((entity.start(), entity.end(), entity.pitch().midi() if entity.is_note() else REST_PITCH)
+                     for entity in entities)
+
         note_count = {}
 
-        for note in notes:
-            if note_count.get(note.length(), None) is None:
-                note_count[note.length()] = 0
+        for note_start, note_end, midi_value in notes:
+            if midi_value == REST_PITCH:
+                continue
 
-            note_count[note.length()] += 1
+            if note_count.get(note_end - note_start, None) is None:
+                note_count[note_end - note_start] = 0
+
+            note_count[note_end - note_start] += 1
 
         return note_count
 
@@ -152,8 +216,13 @@ class Sequence:
 
         time_signatures = time.signatures()
 
+        # Only positions where something happens matter; walk those in order rather than every sample.
+        event_positions = [position for position in set(time_signatures.keys()) | set(self._entities.keys())
+                           if 0 <= position < config.song_length]
+        event_positions.sort()
+
         rest_length = 0
-        for i in range(config.song_length):
+        for i in event_positions:
             if time_signatures.get(i, None) is not None:
                 sig = time_signatures[i]
                 track.append(midi.TimeSignatureEvent(data=[sig.numerator, sig.denominator, 36, 8]))
@@ -175,8 +244,8 @@ class Sequence:
 
 class RootSequence(Sequence):
 
-    def __init__(self, track):
-        Sequence.__init__(self)
+    def __init__(self, track, compact=False):
+        Sequence.__init__(self, compact)
         self.__build_entities(track)
 
     def __build_entities(self, track):
@@ -204,14 +273,49 @@ class RootSequence(Sequence):
 
 class AccompanimentSequence(Sequence):
 
-    def __init__(self, length, part, configuration={}):
-        Sequence.__init__(self)
-        self._entities = {0: Rest(self, 0, length)}
+    def __init__(self, length, part, configuration={}, compact=False):
+        Sequence.__init__(self, compact)
+        self._entities[0] = Rest(self, 0, length)
 
         self._length = length
         self._part = part
         self._motion_tendency = configuration.get('motion_tendency', 0.5)
 
+    def add_run(self, entities):
+        """
+        Bulk alternative to add_entities for a run of entities sorted by start position and not overlapping each
+        other. The run is merged against the existing entities in a single pass, trimming or splitting whatever
+        it covers, and leaves the same entities as adding each one with add_entity would.
+
+        :param entities: sorted list of Entity objects, probably Note or Rest entities
+        """
+        merged = []
+        i = 0
+
+        for existing in self._entities.values():
+            position = existing.start()
+
+            while i < len(entities) and entities[i].start() < existing.end():
+                new_entity = entities[i]
+
+                if new_entity.start() > position:
+                    merged.append(_trimmed(existing, position, new_entity.start()))
+
+                if position <= new_entity.start():
+                    merged.append(new_entity)
+
+                position = max(position, new_entity.end())
+
+                if new_entity.end() > existing.end():
+                    break
+
+                i += 1
+
+            if position < existing.end():
+                merged.append(_trimmed(existing, position, existing.end()))
+
+        self._entities.replace(merged)
+
     def part(self):
         return self._part
 
@@ -219,6 +323,305 @@ class AccompanimentSequence(Sequence):
         return self._motion_tendency
 
 
+def _trimmed(entity, start, end):
+    """
+    Returns entity itself if it already spans [start, end), otherwise a copy of it moved to that span
+    """
+    if entity.start() == start and entity.end() == end:
+        return entity
+
+    entity = copy.copy(entity)
+    entity._start = start
+    entity._end = end
+
+    return entity
+
+
+class EntityMap(collections.MutableMapping):
+    """
+    Map of start position -> Entity which keeps a sorted index of its keys, so that finding the entity
+    covering a position is a bisect rather than a scan of every key. Iterates in position order.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.store = dict()
+        self._positions = []
+        self.update(dict(*args, **kwargs))
+
+    def __getitem__(self, key):
+        return self.store[key]
+
+    def __setitem__(self, key, value):
+        if key not in self.store:
+            bisect.insort(self._positions, key)
+
+        self.store[key] = value
+
+    def __delitem__(self, key):
+        del self.store[key]
+        del self._positions[bisect.bisect_left(self._positions, key)]
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __len__(self):
+        return len(self.store)
+
+    def __contains__(self, key):
+        return key in self.store
+
+    def replace(self, entities):
+        """
+        Replaces the contents of the map with the given entities, which must be sorted by start position
+
+        :param entities: sorted list of Entity objects
+        """
+        self.store = {entity.start(): entity for entity in entities}
+        self._positions = [entity.start() for entity in entities]
+
+    def floor(self, position):
+        """
+        Returns the entity with the greatest start position <= position, or None if there isn't one
+
+        :param position: sample position
+        :return: Entity object or None
+        """
+        index = bisect.bisect_right(self._positions, position) - 1
+
+        if index < 0:
+            return None
+
+        return self.store[self._positions[index]]
+
+    def keys_between(self, start, end):
+        """
+        Returns the sorted keys k where start <= k < end
+
+        :param start: sample position, inclusive
+        :param end: sample position, exclusive
+        :return: list of sample positions
+        """
+        return self._positions[bisect.bisect_left(self._positions, start):bisect.bisect_left(self._positions, end)]
+
+    def values_between(self, start, end):
+        """
+        Yields the entities whose keys k satisfy start <= k < end, in position order
+
+        :param start: sample position, inclusive
+        :param end: sample position, exclusive
+        :return: generator of Entity objects
+        """
+        for i in xrange(bisect.bisect_left(self._positions, start), bisect.bisect_left(self._positions, end)):
+            yield self.store[self._positions[i]]
+
+    def columns(self):
+        """
+        Returns the map as parallel arrays of start, end and midi value (REST_PITCH for rests), in position order
+
+        :return: tuple of array.array: (starts, ends, midi values)
+        """
+        entities = [self.store[position] for position in self._positions]
+
+        return array.array('l', self._positions), \
+            array.array('l', [entity.end() for entity in entities]), \
+            array.array('b', [entity.pitch().midi() if entity.is_note() else REST_PITCH for entity in entities])
+
+
+class CompactEntityMap(collections.MutableMapping):
+    """
+    Array-backed alternative to EntityMap. Entities are stored as parallel typed arrays of start, end and midi
+    value (REST_PITCH for rests) and Note/Rest objects are only materialized when asked for. Materialized entities
+    are copies; changes to them must be written back with __setitem__ to take effect.
+    """
+
+    def __init__(self, sequence, *args, **kwargs):
+        self._sequence = sequence
+        self._starts = array.array('l')
+        self._ends = array.array('l')
+        self._midi_values = array.array('b')
+        self.update(dict(*args, **kwargs))
+
+    def __getitem__(self, key):
+        index = self.__index(key)
+
+        if index is None:
+            raise KeyError(key)
+
+        return self.__materialize(index)
+
+    def __setitem__(self, key, value):
+        midi_value = value.pitch().midi() if value.is_note() else REST_PITCH
+        index = self.__index(key)
+
+        if index is None:
+            index = bisect.bisect_left(self._starts, key)
+            self._starts.insert(index, key)
+            self._ends.insert(index, value.end())
+            self._midi_values.insert(index, midi_value)
+        else:
+            self._ends[index] = value.end()
+            self._midi_values[index] = midi_value
+
+    def __delitem__(self, key):
+        index = self.__index(key)
+
+        if index is None:
+            raise KeyError(key)
+
+        del self._starts[index]
+        del self._ends[index]
+        del self._midi_values[index]
+
+    def __iter__(self):
+        return iter(self._starts)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __contains__(self, key):
+        return self.__index(key) is not None
+
+    def values(self):
+        return [self.__materialize(index) for index in range(len(self._starts))]
+
+    def replace(self, entities):
+        self._starts = array.array('l', [entity.start() for entity in entities])
+        self._ends = array.array('l', [entity.end() for entity in entities])
+        self._midi_values = array.array('b', [entity.pitch().midi() if entity.is_note() else REST_PITCH
+                                              for entity in entities])
+
+    def floor(self, position):
+        index = bisect.bisect_right(self._starts, position) - 1
+
+        if index < 0:
+            return None
+
+        return self.__materialize(index)
+
+    def keys_between(self, start, end):
+        return list(self._starts[bisect.bisect_left(self._starts, start):bisect.bisect_left(self._starts, end)])
+
+    def values_between(self, start, end):
+        for index in xrange(bisect.bisect_left(self._starts, start), bisect.bisect_left(self._starts, end)):
+            yield self.__materialize(index)
+
+    def columns(self):
+        return self._starts, self._ends, self._midi_values
+
+    def __index(self, key):
+        index = bisect.bisect_left(self._starts, key)
+
+        if index < len(self._starts) and self._starts[index] == key:
+            return index
+
+        return None
+
+    def __materialize(self, index):
+        if self._midi_values[index] == REST_PITCH:
+            return Rest(self._sequence, self._starts[index], self._ends[index])
+
+        return Note(self._sequence, self._starts[index], self._ends[index], self._midi_values[index])
+
+
+class OverlayEntityMap(collections.MutableMapping):
+    """
+    Copy-on-write view over another entity map. Writes and deletes are recorded in the overlay and the base map is
+    never modified; entities read through from the base are returned as copies owned by the overlay's sequence,
+    so adjusting them in place (as Sequence.add_entity does) cannot leak into the base.
+    """
+
+    def __init__(self, sequence, base):
+        self._sequence = sequence
+        self._base = base
+        self._store = dict()
+        self._positions = []
+        self._deleted = set()
+
+    def __getitem__(self, key):
+        if key in self._store:
+            return self._store[key]
+
+        if key in self._deleted:
+            raise KeyError(key)
+
+        return self.__own(self._base[key])
+
+    def __setitem__(self, key, value):
+        if key not in self._store:
+            bisect.insort(self._positions, key)
+
+        self._store[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+
+        if key in self._store:
+            del self._store[key]
+            del self._positions[bisect.bisect_left(self._positions, key)]
+
+        if key in self._base:
+            self._deleted.add(key)
+
+    def __iter__(self):
+        return self.__keys(float('-inf'), float('inf'))
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def __contains__(self, key):
+        return key in self._store or (key not in self._deleted and key in self._base)
+
+    def values(self):
+        return list(self.values_between(float('-inf'), float('inf')))
+
+    def replace(self, entities):
+        self._store = {entity.start(): entity for entity in entities}
+        self._positions = [entity.start() for entity in entities]
+        self._deleted = set(self._base.keys())
+
+    def floor(self, position):
+        index = bisect.bisect_right(self._positions, position) - 1
+        own = self._store[self._positions[index]] if index >= 0 else None
+
+        base = self._base.floor(position)
+        while base is not None and base.start() in self._deleted:
+            base = self._base.floor(base.start() - 1)
+
+        if base is None or (own is not None and own.start() >= base.start()):
+            return own
+
+        return self.__own(base)
+
+    def keys_between(self, start, end):
+        return list(self.__keys(start, end))
+
+    def values_between(self, start, end):
+        for key in self.__keys(start, end):
+            yield self[key]
+
+    def columns(self):
+        entities = self.values()
+
+        return array.array('l', [entity.start() for entity in entities]), \
+            array.array('l', [entity.end() for entity in entities]), \
+            array.array('b', [entity.pitch().midi() if entity.is_note() else REST_PITCH for entity in entities])
+
+    def __keys(self, start, end):
+        base_keys = (key for key in self._base.keys_between(start, end)
+                     if key not in self._deleted and key not in self._store)
+        own_keys = self._positions[bisect.bisect_left(self._positions, start):bisect.bisect_left(self._positions, end)]
+
+        return heapq.merge(base_keys, own_keys)
+
+    def __own(self, entity):
+        entity = copy.copy(entity)
+        entity._sequence = self._sequence
+
+        return entity
+
+
 class Entity:
 
     def __init__(self, sequence):
@@ -77,6 +77,46 @@ class TestChords(TestCase):
         self.assertTrue(root_in_bass.root_in_bass())
         self.assertFalse(root_not_in_bass.root_in_bass())
 
+    def test__parse_interns_chords(self):
+        self.assertIs(chords.parse('A-'), chords.parse('Amin'))
+        self.assertIs(chords.parse('G7/B'), chords.parse('G7', 'B'))
+        self.assertIsNot(chords.parse('G7'), chords.parse('G7/B'))
+        self.assertIsInstance(chords.parse('D7sus4'), chords.SevenSusChord)
+        self.assertIsInstance(chords.parse('Ebdim/A'), chords.DiminishedChord)
+        self.assertIsNone(chords.parse('H7'))
+
+    def test__Chord_masks(self):
+        chord = chords.parse('G7')
+
+        self.assertEqual(pitches.pitch_class_mask(MIDI_VALUES['G0'], MIDI_VALUES['B0'], MIDI_VALUES['D0'],
+                                                  MIDI_VALUES['F0']), chord.mask())
+        self.assertTrue(MIDI_VALUES['F5'] in chord)
+        self.assertFalse(MIDI_VALUES['C5'] in chord)
+        self.assertTrue(chord.in_scale(MIDI_VALUES['C5']))
+        self.assertFalse(chord.in_scale(MIDI_VALUES['C#5']))
+        self.assertEqual(2, chord.chord_tone_count(MIDI_VALUES['G1'], MIDI_VALUES['G2'], MIDI_VALUES['B3'],
+                                                   MIDI_VALUES['C4'], -1))
+
+    def test__ChordTimeline(self):
+        fileloader.load(constants.TEST_MIDI + 'mixed_meter.mid', False)
+
+        chords.write('C')
+        chords.write('G7', measure=1, beat=2)
+        change = time.measure(1).beat(2).start()
+
+        self.assertEqual(chords.parse('C'), chords.get(change - 1))
+        self.assertEqual(chords.parse('G7'), chords.get(change))
+        self.assertEqual(chords.parse('G7'), chords.get(config.song_length - 1))
+        self.assertTrue(chords.is_change(change))
+        self.assertFalse(chords.is_change(change + 1))
+
+        timeline = chords.timeline()
+        for i, chord_id in enumerate(timeline.beat_chord_ids()):
+            self.assertEqual(chords.get(time.beat_at_index(i).start()), timeline.palette()[chord_id])
+
+        chords.write('F', measure=1, beat=3)
+        self.assertEqual(chords.parse('F'), chords.get(time.measure(1).beat(3).start()))
+
 
 def set_config(chord_progression):
     time.add_signature(0, time.TimeSignature(numerator=4, denominator=4))
@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+import chords
+import config
+import fileloader
+import harmony
+import ks
+import sequences
+from rhythm import time
+
+
+class TestHarmony(TestCase):
+
+    def tearDown(self):
+        super(TestHarmony, self).tearDown()
+        chords.clear()
+        time.clear()
+        ks.clear()
+
+    def test__HarmonicTimeline(self):
+        fileloader.load('mixed_meter', False)
+        context = harmony.timeline()
+
+        for i in range(time.beat_count()):
+            beat = time.beat_at_index(i)
+            soprano = sequences.soprano().pitch(beat.start()).midi()
+            if sequences.soprano().is_rest(beat.start()):
+                soprano = -1
+
+            self.assertIs(chords.get(beat.start()), context.chord(i))
+            self.assertIs(chords.get(beat.previous().start() if i else 0), context.previous_chord(i))
+            self.assertIs(chords.get(beat.next().start()) if beat.next() else None, context.next_chord(i))
+            self.assertEqual(soprano, context.soprano()[i])
+            self.assertEqual(beat.first_beat(), context.first_beats()[i])
+            self.assertEqual(beat.end() == config.song_length, context.song_ends()[i])
+
+        self.assertIs(context, harmony.timeline())
+
+    def test__timeline_follows_chord_changes(self):
+        fileloader.load('simple', False)
+        context = harmony.timeline()
+
+        chords.write('D', measure=0)
+
+        self.assertIsNot(context, harmony.timeline())
+        self.assertEqual(chords.get(0), harmony.timeline().chord(0))
@@ -0,0 +1,21 @@
+from unittest import TestCase
+
+import intervals
+import pitches
+
+
+class TestIntervals(TestCase):
+
+    def test__parallel_perfect_matches_parallel_movement(self):
+        movements = [(59, 60, 64, 65), (59, 60, 66, 67), (60, 65, 48, 53), (60, 58, 72, 68), (60, 62, 64, 66),
+                     (-1, 60, 64, 65), (64, 65, 59, 60)]
+
+        mask = intervals.parallel_perfect(*zip(*movements))
+
+        self.assertEqual([pitches.parallel_movement(*movement) for movement in movements], list(mask))
+
+    def test__dissonant(self):
+        self.assertEqual([True, True, False, False], list(intervals.dissonant([60, 61, 60, 60], [61, 48, 62, 72])))
+
+    def test__crossed(self):
+        self.assertEqual([False, True, False, False], list(intervals.crossed([48, 60, 60, -1], [55, 55, -1, 55])))
@@ -1,16 +1,22 @@
+import itertools
 from unittest import TestCase
 
 import midi
+import numpy as np
 
 import chords
 import config
 import constants
+import examples
 import fileloader
+import harmony
+import instruments
 import ks
 import note_picker
 import parts
 import pitches
 import sequences
+import util
 import vars
 from rhythm import time
 
@@ -51,6 +57,27 @@ class TestNotePicker(TestCase):
         self.assertEqual(note_picker.preferred_register_score(15, min_thresh, min_lim), 0.0)
         self.assertEqual(note_picker.preferred_register_score(15, max_thresh, max_lim), 0.0)
 
+    def test__register_scores(self):
+        low = parts.ALTO.max_low
+        high = parts.ALTO.max_high
+        table = parts.ALTO.register_scores()
+
+        for value in range(128) + [-1]:
+            expected = note_picker.threshold_encroachment_score(value, low, low + 4) + \
+                note_picker.threshold_encroachment_score(value, high, high - 4) + \
+                note_picker.preferred_register_score(value, high, high - 7)
+            self.assertEqual(table[value], expected)
+
+        low = parts.TENOR.max_low
+        self.assertEqual(parts.TENOR.register_scores()[low + 1],
+                         note_picker.threshold_encroachment_score(low + 1, low, low + 4) +
+                         note_picker.preferred_register_score(low + 1, low, low + 7))
+        self.assertIs(parts.BASS.register_scores(), parts.register_scores(parts.BASS.max_low, parts.BASS.max_high))
+
+        cello = parts.Part(instruments.CELLO.max_low_pitch, instruments.CELLO.max_high_pitch, 'tenor', avoids_low=True)
+        self.assertIs(instruments.CELLO.register_scores(avoids_low=True), cello.register_scores())
+        self.assertIsNot(instruments.CELLO.register_scores(), cello.register_scores())
+
     def test__motion_tendency_score(self):
         fileloader.load(constants.TEST_MIDI + 'quarter_arpeg.mid', False)
 
@@ -130,6 +157,147 @@ class TestNotePicker(TestCase):
                          .parallel_motion_score(candidate, time.beat_at_index(1),
                                                 soprano, sequences.alto(), tenor, sequences.bass()))
 
+    def test__NotePicker_score_all_matches_score(self):
+        fileloader.load('simple', False)
+        picker = note_picker.NotePicker()
+
+        for beat in list(time.iter_strong_beats())[:4]:
+            candidates = note_picker.get_candidate_matrix(beat, sequences.soprano().pitch(beat.start()).midi())
+
+            self.assertEqual([picker.score(beat, candidate) for candidate in candidates],
+                             picker.score_all(beat, candidates).tolist())
+            self.assertEqual(picker.compute(beat), note_picker.NotePicker(batched=True).compute(beat))
+
+    def test__get_candidate_matrix_matches_filtered_product(self):
+        fileloader.load('simple', False)
+
+        for beat in list(time.iter_strong_beats())[:4]:
+            chord = harmony.timeline().chord(time.beat_index(beat.start()))
+            notes = [sorted(set(sequence().part().available_notes(chord))) + [-1]
+                     for sequence in (sequences.alto, sequences.tenor, sequences.bass)]
+
+            for soprano_value in -1, sequences.soprano().pitch(beat.start()).midi():
+                expected = [group + [soprano_value] for group in note_picker.combine_pitch_candidates(*notes)
+                            if note_picker.parts_dont_cross(group, soprano_value)]
+                constrained = [voicing for voicing in expected
+                               if pitches.pitch_class_mask(*[v for v in voicing if v != -1]) & chord.mask() ==
+                               chord.mask()
+                               and (voicing[0] == -1 or soprano_value == -1 or soprano_value - voicing[0] <= 9)
+                               and (voicing[0] == -1 or voicing[1] == -1 or voicing[0] - voicing[1] <= 9)]
+
+                self.assertEqual(expected, note_picker.get_candidate_matrix(beat, soprano_value))
+                self.assertEqual(constrained, note_picker.get_candidate_matrix(beat, soprano_value, max_spacing=9,
+                                                                               required_mask=chord.mask()))
+                self.assertTrue(constrained)
+
+    def test__get_candidate_matrix_spacing_near_top_of_range(self):
+        fileloader.load('simple', False)
+        beat = time.beat_at_index(0)
+        chord = harmony.timeline().chord(0)
+        sequences.alto()._part = parts.Part(100, 128, 'alto')
+        sequences.tenor()._part = parts.Part(90, 128, 'tenor')
+        sequences.bass()._part = parts.Part(80, 128, 'bass')
+        notes = [sorted(set(sequence().part().available_notes(chord))) + [-1]
+                 for sequence in (sequences.alto, sequences.tenor, sequences.bass)]
+
+        expected = [group + [-1] for group in note_picker.combine_pitch_candidates(*notes)
+                    if note_picker.parts_dont_cross(group, -1) and
+                    (group[0] == -1 or group[1] == -1 or group[0] - group[1] <= 24)]
+
+        self.assertTrue([voicing for voicing in expected if voicing[1] + 24 > 127 and voicing[0] != -1])
+        self.assertEqual(expected, note_picker.get_candidate_matrix(beat, -1, max_spacing=24))
+
+    def test__ScoreTables(self):
+        fileloader.load('simple', False)
+        beat = list(time.iter_strong_beats())[1]
+        previous = time.beat_at_index(0)
+        candidates = np.array(note_picker.get_candidate_matrix(beat, sequences.soprano().pitch(beat.start()).midi()))
+
+        for position, sequence in ((note_picker.ALTO_POSITION, sequences.alto()),
+                                   (note_picker.TENOR_POSITION, sequences.tenor()),
+                                   (note_picker.BASS_POSITION, sequences.bass())):
+            sequence.add_entities(sequences.Note(sequence, 0, beat.start(), candidates[0][position]))
+
+        tables = note_picker.ScoreTables(beat, candidates)
+
+        alto = tables.pitches[note_picker.ALTO_POSITION]
+        tenor = tables.pitches[note_picker.TENOR_POSITION]
+
+        self.assertEqual([note_picker.get_alto_score(int(pitch), beat) for pitch in alto],
+                         tables.unary[note_picker.ALTO_POSITION].tolist())
+
+        for i, j in itertools.product(range(len(alto)), range(len(tenor))):
+            parallel = pitches.parallel_movement(sequences.alto().pitch(previous.start()).midi(), int(alto[i]),
+                                                 sequences.tenor().pitch(previous.start()).midi(), int(tenor[j]))
+            self.assertEqual(vars.PARALLEL_MOVEMENT if parallel else 0.0,
+                             tables.pairwise[(note_picker.ALTO_POSITION, note_picker.TENOR_POSITION)][i, j])
+
+        self.assertEqual([note_picker.NotePicker().score(beat, candidate.tolist()) for candidate in candidates],
+                         tables.score_all(candidates).tolist())
+
+    def test__NotePicker_bounded_matches_exhaustive(self):
+        for name in sorted(examples.ALL.keys()):
+            fileloader.load(name, False)
+            exhaustive = note_picker.NotePicker(batched=True)
+            bounded = note_picker.NotePicker(bounded=True)
+
+            for beat, next_beat in util.with_next(time.iter_strong_beats()):
+                picked = exhaustive.compute(beat)
+
+                # ties go to the earliest candidate whichever way the candidates are scored
+                soprano = int(harmony.timeline().soprano()[time.beat_index(beat.start())])
+                candidates = note_picker.get_candidate_matrix(beat, soprano)
+                scores = exhaustive.score_all(beat, candidates).tolist()
+                self.assertEqual(tuple(candidates[scores.index(max(scores))]), picked)
+                self.assertEqual(picked, bounded.compute(beat))
+
+                end = config.song_length if next_beat is None else next_beat.start()
+                for position, sequence in ((note_picker.ALTO_POSITION, sequences.alto()),
+                                           (note_picker.TENOR_POSITION, sequences.tenor()),
+                                           (note_picker.BASS_POSITION, sequences.bass())):
+                    sequence.add_entities(sequences.Note(sequence, beat.start(), end, picked[position]))
+
+            self.assertGreater(bounded.pruned, 0)
+
+            chords.clear()
+            time.clear()
+            ks.clear()
+
+    def test__NotePicker_bounded_with_reversed_weights(self):
+        weights = ('PARALLEL_MOVEMENT', 'DUPLICATE_COEF', 'THIRD_PREFERENCE', 'HARMONY_COEF')
+        for name in weights:
+            self.addCleanup(setattr, vars, name, getattr(vars, name))
+            setattr(vars, name, -getattr(vars, name))
+
+        fileloader.load('simple', False)
+        exhaustive = note_picker.NotePicker(batched=True)
+        bounded = note_picker.NotePicker(bounded=True)
+
+        for beat, next_beat in util.with_next(time.iter_strong_beats()):
+            picked = exhaustive.compute(beat)
+            self.assertEqual(exhaustive.score(beat, picked), exhaustive.score(beat, bounded.compute(beat)))
+
+            end = config.song_length if next_beat is None else next_beat.start()
+            for position, sequence in ((note_picker.ALTO_POSITION, sequences.alto()),
+                                       (note_picker.TENOR_POSITION, sequences.tenor()),
+                                       (note_picker.BASS_POSITION, sequences.bass())):
+                sequence.add_entities(sequences.Note(sequence, beat.start(), end, picked[position]))
+
+    def test__BoundedSearch_alto_scores(self):
+        fileloader.load('simple', False)
+        beat = time.beat_at_index(0)
+        candidates = note_picker.get_candidate_matrix(beat, sequences.soprano().pitch(beat.start()).midi())
+        search = note_picker.BoundedSearch(beat, np.array(candidates))
+
+        for bass, tenor in sorted(set((candidate[note_picker.BASS_POSITION], candidate[note_picker.TENOR_POSITION])
+                                      for candidate in candidates)):
+            altos, scores = search.alto_scores(bass, tenor)
+            completions = [candidate for candidate in candidates if candidate[note_picker.BASS_POSITION] == bass and
+                           candidate[note_picker.TENOR_POSITION] == tenor]
+
+            self.assertEqual({candidate[note_picker.ALTO_POSITION]: note_picker.NotePicker().score(beat, candidate)
+                              for candidate in completions}, dict(zip(altos.tolist(), scores.tolist())))
+
     def test__flicker_avoidance_score(self):
         fileloader.load(constants.TEST_MIDI + 'flicker.mid', False)
         sequence = sequences.soprano()
@@ -143,6 +311,19 @@ class TestNotePicker(TestCase):
         self.assertEqual(1 * vars.FLICKER_COEF, note_picker.flicker_avoidance_score(c, beat2, sequence))
         self.assertEqual(2 * vars.FLICKER_COEF, note_picker.flicker_avoidance_score(e, beat3, sequence))
 
+    def test__voice_history_scores(self):
+        fileloader.load(constants.TEST_MIDI + 'flicker.mid', False)
+        sequence = sequences.soprano()
+
+        for beat in [time.beat_at_index(i) for i in range(time.beat_count())]:
+            history = note_picker.voice_history(beat, sequence)
+
+            for candidate in range(pitches.MIDI_VALUES['A4'], pitches.MIDI_VALUES['A5']) + [-1]:
+                self.assertEqual(note_picker.flicker_avoidance_score(candidate, beat, sequence),
+                                 note_picker.history_flicker_avoidance_score(candidate, history))
+                self.assertEqual(note_picker.linear_motion_score(candidate, beat, sequence),
+                                 note_picker.history_linear_motion_score(candidate, history))
+
 
 def read_pattern(file_name):
     try:
@@ -169,6 +169,20 @@ class TestPitches(TestCase):
         self.assertEqual(c0, pitches.midi_value(string_c0))
         self.assertEqual(c2, pitches.midi_value(string_c2))
 
+    def test__parse_shares_pitches(self):
+        self.assertIs(pitches.parse(61), pitches.parse(61))
+        self.assertIs(pitches.parse(61), pitches.parse('C#5'))
+        self.assertEqual('C#', pitches.parse('Db').species())
+        self.assertTrue(pitches.same_species(pitches.parse(61), 'Db'))
+
+    def test__scale_between(self):
+        d = 50
+        scale = pitches.ionian(d)
+
+        self.assertEqual((49, 50, 52), pitches.scale_between(scale, 48, 52))
+        self.assertEqual((), pitches.scale_between(scale, 53, 53))
+        self.assertIs(scale, pitches.ionian(d - 48))
+
     def test__parallel_motion(self):
         par_4ths = 59, 60, 64, 65
         par_5ths = 59, 60, 66, 67
@@ -0,0 +1,162 @@
+from unittest import TestCase
+
+import chords
+import config
+import constants
+import fileloader
+import ks
+import ks_detector
+import note_picker
+import parts
+import phrasing
+import progression
+import sequences
+import util
+import vars
+from rhythm import time
+
+
+class TestProgression(TestCase):
+
+    def tearDown(self):
+        super(TestProgression, self).tearDown()
+        chords.clear()
+        time.clear()
+        ks.clear()
+
+    def test__ProgressionPicker_compute(self):
+        fileloader.load('simple', False)
+        picker = progression.ProgressionPicker()
+        candidates = picker.compute()
+
+        beats = list(time.iter_strong_beats())
+        self.assertEqual(len(beats), len(candidates))
+        for beat, candidate in zip(beats, candidates):
+            self.assertIn(candidate, note_picker.get_candidate_matrix(beat, progression.soprano_value(beat)))
+
+        self.assertAlmostEqual(picker.score, self.__arrangement_score(candidates))
+
+    def test__ProgressionPicker_beats_greedy_picks_without_flicker(self):
+        # without flicker avoidance every term only looks one strong beat back, and the Viterbi pick is exact
+        self.addCleanup(setattr, vars, 'FLICKER_COEF', vars.FLICKER_COEF)
+        vars.FLICKER_COEF = 0.0
+
+        fileloader.load('simple', False)
+        viterbi = progression.ProgressionPicker()
+        viterbi.compute()
+
+        chords.clear()
+        time.clear()
+        ks.clear()
+        fileloader.load('simple', False)
+
+        greedy = note_picker.NotePicker()
+        beats = list(time.iter_strong_beats())
+        greedy_score = 0.0
+
+        for i, beat in enumerate(beats):
+            candidate = list(greedy.compute(beat))
+            greedy_score += greedy.score(beat, candidate)
+            end = config.song_length if i == len(beats) - 1 else beats[i + 1].start()
+
+            for position, sequence in progression.VOICES:
+                sequence().add_entities(sequences.Note(sequence(), beat.start(), end, candidate[position]))
+
+        self.assertGreaterEqual(viterbi.score, greedy_score)
+
+    def test__ProgressionPicker_exact_without_flicker(self):
+        self.addCleanup(setattr, vars, 'FLICKER_COEF', vars.FLICKER_COEF)
+        vars.FLICKER_COEF = 0.0
+        self.__load_small_song()
+
+        picker = progression.ProgressionPicker()
+        picker.compute()
+
+        self.assertAlmostEqual(self.__best_score(), picker.score)
+
+    def test__BeamPicker_compute(self):
+        self.__load_small_song()
+        best_score = self.__best_score()
+
+        for width in 1, 4, 16:
+            picker = progression.BeamPicker(width)
+            candidates = picker.compute()
+
+            self.assertLessEqual(picker.score, best_score + 1e-9)
+            self.assertAlmostEqual(picker.score, self.__arrangement_score(candidates))
+
+        # wide enough to keep every partial arrangement
+        picker = progression.BeamPicker(10000)
+        picker.compute()
+        self.assertAlmostEqual(best_score, picker.score)
+
+        picker = progression.ProgressionPicker()
+        picker.compute()
+        self.assertLessEqual(picker.score, best_score + 1e-9)
+
+    def test__BeamPicker_width_one_picks_greedily(self):
+        fileloader.load('simple', False)
+        candidates = progression.BeamPicker(1).compute()
+        greedy = note_picker.NotePicker()
+
+        for candidate, (beat, next_beat) in zip(candidates, util.with_next(time.iter_strong_beats())):
+            best = list(greedy.compute(beat))
+            self.assertAlmostEqual(greedy.score(beat, best), greedy.score(beat, candidate))
+
+            end = config.song_length if next_beat is None else next_beat.start()
+            for position, sequence in progression.VOICES:
+                sequence().add_entities(sequences.Note(sequence(), beat.start(), end, candidate[position]))
+
+    def __arrangement_score(self, candidates):
+        """
+        :return: total NotePicker.score() of an arrangement once written. Scores only look back from their beat, so
+                 they are the same as when picking beat by beat.
+        """
+        progression.write_arrangement(candidates)
+        picker = note_picker.NotePicker()
+
+        return sum(picker.score(beat, list(candidate)) for beat, candidate in zip(time.iter_strong_beats(), candidates))
+
+    def __load_small_song(self):
+        """
+        Four strong beats with narrow part ranges, so that every arrangement can be scored
+        """
+        fileloader.load(constants.TEST_MIDI + '2beat_join.mid', False)
+        chords.write('C')
+        chords.write('A-', beat=1)
+        chords.write('F', beat=2)
+        chords.write('C', beat=3)
+        ks_detector.detect_and_set_key_signatures()
+        phrasing.detect_and_set_measure_phrasing()
+
+        for sequence, max_low, max_high in ((sequences.alto(), 64, 72), (sequences.tenor(), 55, 64),
+                                            (sequences.bass(), 45, 53)):
+            sequence._part = parts.Part(max_low, max_high, sequence.part().title)
+
+    def __best_score(self):
+        """
+        :return: highest total NotePicker.score() of any arrangement, found by trying them all
+        """
+        beats = list(time.iter_strong_beats())
+        candidates = [note_picker.get_candidate_matrix(beat, progression.soprano_value(beat)) for beat in beats]
+        picker = note_picker.NotePicker()
+
+        def best_from(i):
+            if i == len(beats):
+                return 0.0
+
+            best = None
+            end = config.song_length if i == len(beats) - 1 else beats[i + 1].start()
+
+            for candidate in candidates[i]:
+                score = picker.score(beats[i], candidate)
+
+                for position, sequence in progression.VOICES:
+                    sequence().add_entities(sequences.Note(sequence(), beats[i].start(), end, candidate[position]))
+
+                score += best_from(i + 1)
+                best = score if best is None else max(best, score)
+
+            return best
+
+        return best_from(0)
@@ -1,9 +1,13 @@
 from unittest import TestCase
 
+import midi
+
 import chords
+import config
 import constants
 import fileloader
 import ks
+import pat_util
 import pitches
 import sequences
 from rhythm import time
@@ -55,3 +59,85 @@ class TestSequences(TestCase):
 
         self.assertEqual(new_entity_start, sequence.entities().values()[3].end())
         self.assertEqual(new_entity_end, sequence.entities().values()[5].start())
+
+    def test__Sequence_entity_between_starts(self):
+        fileloader.load(constants.TEST_MIDI + 'entities.mid', False)
+        sequence = sequences.soprano()
+
+        starts = sequence.entities().keys()
+
+        self.assertEqual(sorted(starts), starts)
+        for start, end in zip(starts, starts[1:]):
+            self.assertEqual(start, sequence.entity(start).start())
+            self.assertEqual(start, sequence.entity(end - 1).start())
+            self.assertEqual(start, sequence.entity(end).previous_entity().start())
+
+    def test__Sequence_to_pattern(self):
+        fileloader.load(constants.TEST_MIDI + 'entities.mid', False)
+        sequence = sequences.soprano()
+
+        notes = [entity for entity in sequence.entities().values() if entity.is_note()]
+        note_ons = [event for event in sequence.to_pattern()[0] if isinstance(event, midi.NoteOnEvent)]
+
+        self.assertEqual([note.pitch().midi() for note in notes], [event.data[0] for event in note_ons])
+        self.assertEqual(notes[-1].end(), pat_util.sample_length(sequence.to_pattern()))
+
+    def test__Sequence_compact_matches_entity_map(self):
+        fileloader.load(constants.TEST_MIDI + 'entities.mid', False)
+        track = pat_util.sorted_note_events(midi.read_midifile(constants.TEST_MIDI + 'entities.mid'))
+
+        sequence = sequences.RootSequence(track)
+        compact = sequences.RootSequence(track, compact=True)
+
+        for s in sequence, compact:
+            s.add_entities(sequences.Note(s, 144, 528, pitches.Pitch(61)), sequences.Rest(s, 600, 624))
+
+        self.assertEqual(sequence.entities().keys(), compact.entities().keys())
+        self.assertEqual(sequence.entities().values(), compact.entities().values())
+        self.assertEqual(sequence.note_duration_count(), compact.note_duration_count())
+        self.assertEqual(sequence.note_duration_count(144, 600), compact.note_duration_count(144, 600))
+        self.assertEqual(sequence.entity(530), compact.entity(530))
+
+    def test__Sequence_entities_between_overlapping(self):
+        fileloader.load(constants.TEST_MIDI + 'entities.mid', False)
+        sequence = sequences.soprano()
+
+        entities = sequence.entities().values()
+        start = entities[1].start() + 1
+        end = entities[3].start()
+
+        self.assertEqual(entities[2:3], list(sequence.entities_between(start, end)))
+        self.assertEqual(entities[1:3], list(sequence.entities_overlapping(start, end)))
+        self.assertEqual(entities[1:4], list(sequence.entities_overlapping(start, end + 1)))
+        self.assertEqual([], list(sequence.entities_overlapping(end, end)))
+
+    def test__Sequence_snapshot_leaves_original(self):
+        fileloader.load(constants.TEST_MIDI + 'entities.mid', False)
+        sequence = sequences.soprano()
+        track = pat_util.sorted_note_events(midi.read_midifile(constants.TEST_MIDI + 'entities.mid'))
+        expected = sequences.RootSequence(track)
+
+        original = sequence.entities().values()
+        snapshot = sequence.snapshot()
+
+        for s in snapshot, expected:
+            s.add_entities(sequences.Note(s, 144, 528, pitches.Pitch(61)), sequences.Rest(s, 600, 624))
+
+        self.assertEqual(original, sequence.entities().values())
+        self.assertEqual(expected.entities().keys(), snapshot.entities().keys())
+        self.assertEqual(expected.entities().values(), snapshot.entities().values())
+        self.assertEqual(expected.entity(530), snapshot.entity(530))
+        self.assertEqual(expected.note_duration_count(), snapshot.note_duration_count())
+
+    def test__AccompanimentSequence_add_run_matches_add_entities(self):
+        fileloader.load(constants.TEST_MIDI + 'entities.mid', False)
+
+        expected = sequences.alto()
+        sequence = sequences.AccompanimentSequence(config.song_length, expected.part())
+        run = [(0, 96, 60), (144, 528, 61), (528, 600, 62), (624, 700, 63)]
+
+        expected.add_entities(*[sequences.Note(expected, start, end, pitch) for start, end, pitch in run])
+        sequence.add_run([sequences.Note(sequence, start, end, pitch) for start, end, pitch in run])
+
+        self.assertEqual(expected.entities().keys(), sequence.entities().keys())
+        self.assertEqual(expected.entities().values(), sequence.entities().values())
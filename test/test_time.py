@@ -1,6 +1,7 @@
 from unittest import TestCase
 
 import chords
+import config
 import constants
 import fileloader
 import ks
@@ -49,4 +50,66 @@ class TestTime(TestCase):
 
         number_of_measures = 11
 
-        self.assertEqual(number_of_measures, len(time.measures().keys()))
\ No newline at end of file
+        self.assertEqual(number_of_measures, len(time.measures().keys()))
+
+    def test__Beat_previous_next(self):
+        fileloader.load(constants.TEST_MIDI + 'mixed_meter.mid', False)
+
+        first = time.beat_at_index(0)
+        last = time.beat_at_index(len(time.beats()) - 1)
+
+        self.assertIsNone(first.previous())
+        self.assertIsNone(last.next())
+        self.assertEqual(time.beat_at_index(1), first.next())
+        self.assertEqual(first, first.next().previous())
+        self.assertEqual(config.song_length, last.end())
+
+    def test__beat_at_position(self):
+        fileloader.load(constants.TEST_MIDI + 'mixed_meter.mid', False)
+
+        beat = time.measure(2).beat(3)
+
+        self.assertEqual(beat, time.beat_at_position(beat.start()))
+        self.assertEqual(beat, time.beat_at_position(beat.end() - 1))
+        self.assertEqual(time.signature(beat.start()), beat.time_signature())
+
+    def test__add_delete_signature_matches_set_signatures(self):
+        fileloader.load(constants.TEST_MIDI + 'mixed_meter.mid', False)
+
+        signatures = dict(time.signatures())
+        position = time.measure(5).start()
+        three_four = time.TimeSignature(numerator=3, denominator=4)
+
+        def grid():
+            return [(beat.start(), beat.end(), beat.time_signature(), beat.index_in_measure(), beat.parent().start(),
+                     beat.next() and beat.next().start())
+                    for beat in [time.beat_at_index(i) for i in range(len(time.beats()))]]
+
+        time.add_signature(position, three_four)
+        incremental = grid()
+        time.set_signatures(dict(signatures.items() + [(position, three_four)]))
+        self.assertEqual(grid(), incremental)
+
+        time.delete_signature(position)
+        incremental = grid()
+        time.set_signatures(signatures)
+        self.assertEqual(grid(), incremental)
+
+        # a signature past the song end changes nothing but the beats overhanging the last measure
+        time.add_signature(config.song_length + config.resolution, three_four)
+        time.delete_signature(config.song_length + config.resolution)
+        self.assertEqual(grid(), incremental)
+
+        position = time.measure(-1).start()
+        time.add_signature(position, three_four)
+        incremental = grid()
+        time.set_signatures(dict(signatures.items() + [(position, three_four)]))
+        self.assertEqual(grid(), incremental)
+
+    def test__iter_strong_beats(self):
+        fileloader.load(constants.TEST_MIDI + 'mixed_meter.mid', False)
+
+        strong_beats = [beat for measure in time.measures().values() for beat in measure.strong_beats()]
+
+        self.assertEqual(strong_beats, list(time.iter_strong_beats()))
+        self.assertEqual(time.measure_count(), len(list(time.iter_measures())))
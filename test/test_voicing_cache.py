@@ -0,0 +1,97 @@
+import cPickle
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import chords
+import ks
+import note_picker
+import parts
+import voicing_cache
+from rhythm import time
+
+
+class TestVoicingCache(TestCase):
+
+    def setUp(self):
+        super(TestVoicingCache, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        super(TestVoicingCache, self).tearDown()
+        shutil.rmtree(self.directory)
+        chords.clear()
+        time.clear()
+        ks.clear()
+
+    def test__voicings_match_filtered_product(self):
+        cache = voicing_cache.VoicingCache()
+        wide = (parts.Part(30, 90, 'alto'), parts.Part(20, 80, 'tenor'), parts.Part(5, 70, 'bass'))
+
+        for part_set in ((parts.ALTO, parts.TENOR, parts.BASS), wide):
+            for name in ('C', 'C#m', 'G7', 'F#', 'Bdim', 'E7sus', 'G7/B'):
+                chord = chords.parse(name)
+                notes = [sorted(set(part.available_notes(chord))) for part in part_set]
+                cached = cache.voicings(chord.mask(), *part_set)
+
+                self.assertEqual(cached.dtype.name, 'int8')
+                self.assertEqual(cached.tolist(), [group for group in note_picker.combine_pitch_candidates(
+                    *[part_notes + [-1] for part_notes in notes]) if note_picker.parts_dont_cross(group, -1)])
+
+        self.assertEqual(len(cache), 10)
+
+    def test__generate_voicings_prunes_spacing(self):
+        alto, tenor, bass = [-5, 0, 4, 7, 12, 16, 19], [-8, -5, 0, 4, 7, 12], [-12, -8, -5, 0, 4]
+        rest = voicing_cache.STORED_REST
+
+        for max_spacing in None, 0, 7:
+            expected = [[a, t, b] for b in bass + [rest] for t in tenor + [rest] for a in alto + [rest]
+                        if (b <= t or t == rest) and (t <= a or a == rest)
+                        and (max_spacing is None or a == rest or t == rest or a - t <= max_spacing)]
+
+            self.assertEqual(expected, list(voicing_cache.generate_voicings(alto, tenor, bass, max_spacing)))
+            self.assertEqual(expected, voicing_cache.non_crossing_voicings(alto, tenor, bass, max_spacing).tolist())
+
+    def test__normal_form(self):
+        c_major = chords.parse('C').mask()
+
+        self.assertEqual(voicing_cache.rotate(c_major, 2), chords.parse('D').mask())
+        self.assertEqual(voicing_cache.rotate(c_major, -1), chords.parse('B').mask())
+        self.assertEqual(voicing_cache.normal_form(c_major), (c_major, 0))
+        self.assertEqual(voicing_cache.normal_form(chords.parse('F#').mask()), (c_major, 6))
+        self.assertEqual(voicing_cache.normal_form(chords.parse('A-').mask()),
+                         voicing_cache.normal_form(chords.parse('C-').mask())[:1] + (9,))
+
+    def test__save(self):
+        path = os.path.join(self.directory, 'voicings')
+        cache = voicing_cache.VoicingCache(path)
+        voicings = cache.voicings(chords.parse('A7').mask(), parts.ALTO, parts.TENOR, parts.BASS)
+        cache.save()
+
+        warm = voicing_cache.VoicingCache(path)
+        self.assertEqual(len(warm), 1)
+        self.assertEqual(warm.voicings(chords.parse('A7').mask(), parts.ALTO, parts.TENOR, parts.BASS).tolist(),
+                         voicings.tolist())
+
+        with open(path, 'wb') as cache_file:
+            cache_file.write('not a cache')
+        self.assertEqual(len(voicing_cache.VoicingCache(path)), 0)
+
+    def test__load_corrupt(self):
+        path = os.path.join(self.directory, 'voicings')
+
+        for payload in (7, (voicing_cache.VERSION, []), (voicing_cache.VERSION - 1, {}), (voicing_cache.VERSION,)):
+            with open(path, 'wb') as cache_file:
+                cPickle.dump(payload, cache_file, cPickle.HIGHEST_PROTOCOL)
+            self.assertEqual(len(voicing_cache.VoicingCache(path)), 0)
+
+        with open(path, 'wb') as cache_file:
+            cache_file.write('\x80\x02c__nonexistent__\nname\nq\x00.')
+        self.assertEqual(len(voicing_cache.VoicingCache(path)), 0)
+
+        with open(path, 'wb') as cache_file:
+            cPickle.dump((voicing_cache.VERSION, {}), cache_file, cPickle.HIGHEST_PROTOCOL)
+        cache = voicing_cache.VoicingCache(path)
+        cache.voicings(chords.parse('C').mask(), parts.ALTO, parts.TENOR, parts.BASS)
+        self.assertEqual(len(cache), 1)
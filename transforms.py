@@ -28,7 +28,7 @@ def get_all_transforms(start_position, end_position, max_subdivisions):
         high_thresh = min([p for p in pitches[i] if p != -1] + [sequence.part().max_high])
         low_thresh = sequence.part().max_low if i == len(satb) - 1 else min(sequence.part().max_low, pitches[i - 1])
 
-        bounded_pitches = [pitch for pitch in chord.scale() if low_thresh <= pitch <= high_thresh]
+        bounded_pitches = chord.scale_between(low_thresh, high_thresh)
 
         sequence_transforms = []
         for i, direction_set_group in enumerate(direction_set_groups):
@@ -5,4 +5,24 @@ def key_for_highest_value(item_map):
         if item_map[key] > high_score:
             winner = key
             high_score = item_map[key]
-    return winner
\ No newline at end of file
+    return winner
+
+
+def with_next(iterable):
+    """
+    Streams (item, next_item) pairs from an iterable without building a list of it. The last item is paired with None.
+
+    :param iterable: any iterable, e.g. a generator
+    """
+    iterator = iter(iterable)
+
+    try:
+        current = next(iterator)
+    except StopIteration:
+        return
+
+    for following in iterator:
+        yield current, following
+        current = following
+
+    yield current, None
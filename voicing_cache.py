@@ -0,0 +1,227 @@
+"""
+Cache of the voicings note_picker.get_candidate_matrix() chooses from. Which voicings a chord allows only depends
+on its pitch classes and the ranges of the alto, tenor and bass parts, and a handful of chord types make up nearly
+every beat of a song, so voicings are worked out once per chord type and set of ranges rather than once per beat.
+
+Entries are stored for each chord type in a normal form transposed down to C (see normal_form()), over ranges widened
+down by an octave. Any transposition of the chord type is then the stored voicings moved up, less those which leave
+the parts' ranges. Entries are generated by non_crossing_voicings(), which only ever produces the voicings it keeps,
+and are kept on disk between runs, see save().
+"""
+
+import bisect
+import cPickle
+import os
+
+import numpy as np
+
+import constants
+import intervals
+
+# bump whenever the layout or meaning of stored entries changes, so that stale cache files are ignored
+VERSION = 2
+
+# marks rests in stored entries, whose widened ranges may reach below midi value 0
+STORED_REST = np.iinfo(np.int8).min
+
+__cache = None
+
+
+def cache():
+    """
+    :return: VoicingCache backed by constants.VOICING_CACHE, loaded on first use
+    """
+    global __cache
+
+    if __cache is None:
+        __cache = VoicingCache(constants.VOICING_CACHE)
+
+    return __cache
+
+
+def save():
+    """
+    Writes the entries worked out this run to constants.VOICING_CACHE, so the next run starts with them
+    """
+    if __cache is not None:
+        __cache.save()
+
+
+def clear():
+    global __cache
+    __cache = None
+
+
+class VoicingCache:
+
+    def __init__(self, path=None):
+        """
+        :param path: file entries are read from and saved to. Nothing is read or saved if None
+        """
+        self.path = path
+        self._entries = self.__load()
+        self._transposed = {}
+        self._dirty = False
+
+    def voicings(self, chord_mask, alto_part, tenor_part, bass_part, max_spacing=None):
+        """
+        Every voicing of a chord in which the parts don't cross, before the soprano is taken into account. Each part
+        may also rest (-1). Voicings come out in the order note_picker.get_candidate_matrix() returns them, bass
+        varying slowest and alto fastest.
+
+        :param chord_mask: pitch class mask of the chord, see chords.Chord.mask()
+        :param alto_part: parts.Part of the alto
+        :param tenor_part: parts.Part of the tenor
+        :param bass_part: parts.Part of the bass
+        :param max_spacing: if given, the largest interval allowed between the alto and tenor. Rests are exempt.
+        :return: 2d int8 numpy array, one [alto, tenor, bass] row per voicing. Must not be modified
+        """
+        ranges = tuple((part.max_low, part.max_high) for part in (alto_part, tenor_part, bass_part))
+        key = (chord_mask, ranges, max_spacing)
+
+        if key not in self._transposed:
+            normal_mask, transposition = normal_form(chord_mask)
+            stored = self.__stored(normal_mask, ranges, max_spacing)
+
+            self._transposed[key] = transpose(stored, transposition, ranges)
+
+        return self._transposed[key]
+
+    def __len__(self):
+        """
+        :return: number of chord types and ranges stored
+        """
+        return len(self._entries)
+
+    def save(self):
+        if self.path is None or not self._dirty:
+            return
+
+        with open(self.path, 'wb') as cache_file:
+            cPickle.dump((VERSION, self._entries), cache_file, cPickle.HIGHEST_PROTOCOL)
+
+        self._dirty = False
+
+    def __stored(self, chord_mask, ranges, max_spacing):
+        """
+        :return: voicings of a chord type in normal form over ranges widened down by an octave, rests stored as
+                 STORED_REST
+        """
+        key = (chord_mask, ranges, max_spacing)
+
+        if key not in self._entries:
+            self._entries[key] = non_crossing_voicings(*[pitches_in_range(chord_mask, low - 12, high)
+                                                         for low, high in ranges], max_spacing=max_spacing)
+            self._dirty = True
+
+        return self._entries[key]
+
+    def __load(self):
+        if self.path is None or not os.path.isfile(self.path):
+            return {}
+
+        try:
+            with open(self.path, 'rb') as cache_file:
+                payload = cPickle.load(cache_file)
+        except Exception:
+            return {}
+
+        if not isinstance(payload, tuple) or len(payload) != 2 or payload[0] != VERSION or \
+                not isinstance(payload[1], dict):
+            return {}
+
+        return payload[1]
+
+
+def normal_form(mask):
+    """
+    Transposes a pitch class mask down so that it contains C, choosing among its pitch classes the one which leaves
+    the lowest mask. Transpositions of the same chord type share a normal form.
+
+    :return: (mask in normal form, number of semitones to move it up by to get the given mask back)
+    """
+    transpositions = [pitch_class for pitch_class in range(12) if mask & (1 << pitch_class)] or [0]
+    transposition = min(transpositions, key=lambda pitch_class: rotate(mask, -pitch_class))
+
+    return rotate(mask, -transposition), transposition
+
+
+def rotate(mask, semitones):
+    """
+    :return: pitch class mask transposed by the given number of semitones
+    """
+    semitones %= 12
+
+    return ((mask << semitones) | (mask >> (12 - semitones))) & 0xfff
+
+
+def pitches_in_range(mask, low, high):
+    """
+    :return: sorted values, possibly negative, of the pitch classes in mask with low < value < high
+    """
+    return [value for value in range(low + 1, high) if mask & (1 << (value % 12))]
+
+
+def non_crossing_voicings(alto_candidates, tenor_candidates, bass_candidates, max_spacing=None):
+    """
+    :param max_spacing: if given, the largest interval allowed between the alto and tenor. Rests are exempt.
+    :return: 2d int8 numpy array of the [alto, tenor, bass] voicings generate_voicings() produces
+    """
+    voicings = np.array(list(generate_voicings(alto_candidates, tenor_candidates, bass_candidates, max_spacing)),
+                        dtype=np.int8)
+
+    return voicings.reshape(len(voicings), 3)
+
+
+def generate_voicings(alto_candidates, tenor_candidates, bass_candidates, max_spacing=None):
+    """
+    Generates the voicings in which the parts don't cross, as note_picker.parts_dont_cross() has it, rather than
+    filtering the full product of the candidates. Each part may also rest, stored as STORED_REST. Bass varies slowest
+    and alto fastest, with rests after each part's notes.
+
+    Each part's notes are bisected down to the range left open by the parts already chosen: the tenor's by the bass,
+    the alto's by the tenor and max_spacing. The cost so scales with the number of voicings generated.
+
+    :param alto_candidates: sorted values available to the alto, without rests
+    :param tenor_candidates: sorted values available to the tenor, without rests
+    :param bass_candidates: sorted values available to the bass, without rests
+    :param max_spacing: if given, the largest interval allowed between the alto and tenor. Rests are exempt.
+    :return: generator of [alto, tenor, bass] lists
+    """
+    for bass in bass_candidates + [STORED_REST]:
+        for tenor in __between(tenor_candidates, bass, None) + [STORED_REST]:
+            if tenor == STORED_REST or max_spacing is None:
+                altos = __between(alto_candidates, tenor, None)
+            else:
+                altos = __between(alto_candidates, tenor, tenor + max_spacing)
+
+            for alto in altos + [STORED_REST]:
+                yield [alto, tenor, bass]
+
+
+def __between(values, low, high):
+    """
+    :return: the values v of a sorted list with low <= v <= high, high being unbounded if None
+    """
+    last = len(values) if high is None else bisect.bisect_right(values, high)
+
+    return values[bisect.bisect_left(values, low):last]
+
+
+def transpose(voicings, semitones, ranges):
+    """
+    :param voicings: 2d numpy array of stored [alto, tenor, bass] voicings
+    :param semitones: number of semitones to move every note up by
+    :param ranges: (max_low, max_high) of the alto, tenor and bass, both exclusive
+    :return: 2d int8 numpy array of the moved voicings which stay within the ranges, in their original order, with
+             rests as intervals.REST
+    """
+    values = voicings.astype(np.int16)
+    rests = values == STORED_REST
+    values[~rests] += semitones
+    values[rests] = intervals.REST
+
+    low, high = np.array(ranges).T
+    keep = (rests | ((low < values) & (values < high))).all(axis=1)
+
+    return values[keep].astype(np.int8)